@@ -1,5 +1,8 @@
 import re
-import requests
+
+from m3u_parser import parse_lines
+from m3u_writer import PlaylistWriter
+from playlist_fetch import stream_all
 
 # ===============================
 # PLAYLIST LINKS
@@ -24,62 +27,24 @@ rules = [
     "SET HD SonyLiv : SonyLiv | Entertainment : JioTV+ | Entertainment"
 ]
 
-# ===============================
-# FETCH PLAYLIST
-# ===============================
-
-def fetch_playlist(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 IPTV Parser"
-    }
-    r = requests.get(url, headers=headers, timeout=30)
-    return r.text if r.status_code == 200 else ""
-
-# ===============================
-# SPLIT EXTINF BLOCKS
-# ===============================
-
-def split_blocks(content):
-    return re.split(r'(?=#EXTINF)', content)
-
 # ===============================
 # START OUTPUT FILE
 # ===============================
 
-open(output_file, "w", encoding="utf-8").close()
+output = PlaylistWriter(output_file, header="")
 
 # ===============================
-# PROCESS
+# MATCH ENTRIES AS THEY ARRIVE
 # ===============================
 
-for link_name, url in playlist_links.items():
-
-    playlist = fetch_playlist(url)
-    if not playlist:
-        continue
-
-    blocks = split_blocks(playlist)
-
-    for block in blocks:
-
-        lines = block.strip().split("\n")
-        if not lines:
-            continue
+def select_entries(link_name, lines):
+    """Return the entries of a playlist stream that match a rule, regrouped."""
+    selected = []
 
-        extinf_line = lines[0]
-        if not extinf_line.startswith("#EXTINF"):
-            continue
+    for entry in parse_lines(lines):
 
-        # Extract channel name
-        channel_name = extinf_line.split(",")[-1].strip().lower()
-        channel_name = re.sub(r"\s+", " ", channel_name)
-
-        # Extract group title
-        group_title = ""
-        match = re.search(r'group-title="([^"]+)"', extinf_line, re.IGNORECASE)
-        if match:
-            group_title = match.group(1).strip().lower()
-            group_title = re.sub(r"\s+", " ", group_title)
+        channel_name = re.sub(r"\s+", " ", entry.name.strip().lower())
+        group_title = re.sub(r"\s+", " ", entry.get("group-title").strip().lower())
 
         for rule in rules:
 
@@ -96,18 +61,31 @@ for link_name, url in playlist_links.items():
                 rule_search in group_title
             ):
 
-                new_extinf = re.sub(
-                    r'group-title="[^"]*"',
-                    f'group-title="{rule_replace}"',
-                    extinf_line,
-                    flags=re.IGNORECASE
-                )
+                entry.set("group-title", rule_replace)
+                selected.append(entry)
 
-                block = block.replace(extinf_line, new_extinf)
+                break
 
-                with open(output_file, "a", encoding="utf-8") as f:
-                    f.write(block.strip() + "\n\n")
+    return selected
 
-                break
+# ===============================
+# FETCH AND FILTER PLAYLISTS
+# ===============================
+
+playlists = stream_all(playlist_links, select_entries)
+
+# ===============================
+# PROCESS
+# ===============================
+
+for link_name, entries in playlists.items():
+
+    if not entries:
+        continue
+
+    for entry in entries:
+        output.write_entry(entry)
+
+output.commit()
 
 print(f"Playlist written to {output_file}")
@@ -1,15 +1,40 @@
 import os
 import sys
-import requests
 import re
 
-def fetch_m3u_blocks_from_url(url):
-    """Fetch playlist from URL and split into blocks (#EXTINF ...)."""
-    response = requests.get(url)
-    response.raise_for_status()
-    # Lines are stripped of leading/trailing whitespace and empty lines removed
-    lines = [line.strip() for line in response.text.splitlines() if line.strip()]
-    return split_into_blocks(lines)
+from channel_rules import compile_alternation
+from m3u_parser import format_entry, parse_lines
+from playlist_fetch import stream_all
+
+LINK_PATTERN = re.compile(r'^(http|https|ftp)://.*', re.IGNORECASE)
+
+def fetch_m3u_entries_from_urls(urls, channel_names, exclude_channels):
+    """Stream every playlist URL concurrently, keeping only included or excluded entries.
+
+    Returns (entry, excluded) pairs in URL order.
+    """
+    # Each list becomes one regex, so a channel name is scanned once per list
+    include_pattern = compile_alternation([name.lower() for name in channel_names])
+    exclude_pattern = compile_alternation([bad.lower() for bad in exclude_channels])
+
+    def select_entries(url, lines):
+        selected = []
+        for entry in parse_lines(lines):
+            if not (entry.url and LINK_PATTERN.match(entry.url)):
+                continue
+
+            channel_name = entry.name.lower()
+            include_match = include_pattern is not None and include_pattern.search(channel_name)
+            exclude_match = exclude_pattern is not None and exclude_pattern.search(channel_name)
+
+            if exclude_match:
+                selected.append((entry, True))
+            elif include_match:
+                selected.append((entry, False))
+        return selected
+
+    results = stream_all({url: url for url in urls}, select_entries)
+    return [pair for selected in results.values() if selected for pair in selected]
 
 def fetch_m3u_blocks_from_file(file_path):
     """Read playlist from local file and split into blocks (#EXTINF ...)."""
@@ -19,28 +44,12 @@ def fetch_m3u_blocks_from_file(file_path):
 
 # The function fetch_m3u_blocks_from_file has been removed.
 
-def split_into_blocks(lines):
-    """Split M3U content (list of lines) into blocks starting with #EXTINF."""
-    blocks = []
-    current_block = []
-    for line in lines:
-        if line.startswith("#EXTINF"):
-            if current_block:
-                blocks.append("\n".join(current_block))
-                current_block = []
-        current_block.append(line)
-    if current_block:
-        blocks.append("\n".join(current_block))
-    return blocks
-
 def filter_m3u_blocks(urls, channel_names, exclude_channels, output_dir="output_blocks", output_file="filtered_playlist.m3u"):
-    all_blocks = []
     blocks_from_Github = ""
 
     # Fetch from URLs
-    for url in urls:
-        print(f"Fetching playlist from URL: {url}")
-        all_blocks.extend(fetch_m3u_blocks_from_url(url))
+    print(f"Fetching {len(urls)} playlists")
+    all_entries = fetch_m3u_entries_from_urls(urls, channel_names, exclude_channels)
 
     # Fetch from local file (hardcoded path)
     local_file = "8b249zhj3vg65us_st_so_zfive.m3u"   # 👈 change if needed
@@ -50,44 +59,26 @@ def filter_m3u_blocks(urls, channel_names, exclude_channels, output_dir="output_
 
     # Code for fetching from local file (8ive.m3u) has been removed.
 
-    # Define patterns for filtering and modifying
-    group_title_pattern = r'group-title=".*?"'
-    group_title_replacement = r'group-title="General"'
-    link_pattern = re.compile(r'^(http|https|ftp)://.*', re.IGNORECASE)
+    # Define the group-title modification
+    group_title_replacement = "General"
 
-    matched_blocks = []
+    matched_entries = []
     seen_links = set()
 
-    for block in all_blocks:
-        lines = block.strip().splitlines()
-        extinf_line = None
-        stream_url = None
-
-        # Iterate through the lines in the block to find the #EXTINF and the URL
-        for line in lines:
-            if line.startswith("#EXTINF"):
-                extinf_line = line
-            elif link_pattern.match(line):
-                stream_url = line
-                # Break once the URL is found
-                break
-
-        if extinf_line and stream_url:
-            channel_name = extinf_line.split(",")[-1].strip()
-
-            include_match = any(name.lower() in channel_name.lower() for name in channel_names)
-            exclude_match = any(bad.lower() in channel_name.lower() for bad in exclude_channels)
-
-            if include_match and not exclude_match:
-                if stream_url not in seen_links:
-                    # Apply find and replace (group-title) modification
-                    modified_block = re.sub(group_title_pattern, group_title_replacement, block)
-                    matched_blocks.append(modified_block)
-                    seen_links.add(stream_url)
-                else:
-                    print(f"Skipping duplicate URL for channel: {channel_name}")
-            elif exclude_match:
-                print(f"Excluded unwanted channel: {channel_name}")
+    for entry, excluded in all_entries:
+        stream_url = entry.url
+        channel_name = entry.name
+
+        if excluded:
+            print(f"Excluded unwanted channel: {channel_name}")
+        elif stream_url not in seen_links:
+            # Apply find and replace (group-title) modification
+            if "group-title" in entry.attrs:
+                entry.set("group-title", group_title_replacement)
+            matched_entries.append(entry)
+            seen_links.add(stream_url)
+        else:
+            print(f"Skipping duplicate URL for channel: {channel_name}")
 
     # Ensure output folder exists and write the final unique blocks
     os.makedirs(output_dir, exist_ok=True)
@@ -95,11 +86,11 @@ def filter_m3u_blocks(urls, channel_names, exclude_channels, output_dir="output_
     with open(output_path, "w", encoding="utf-8") as out:
         out.write("#EXTM3U\n\n")
         # Join all blocks with a single newline separator for proper formatting
-        out.write("\n\n".join(matched_blocks))
+        out.write("\n\n".join(format_entry(entry) for entry in matched_entries))
         out.write(blocks_from_Github)
 
-    print(f"Saved {len(matched_blocks)} unique matched blocks into: {output_path}")
-    return matched_blocks
+    print(f"Saved {len(matched_entries)} unique matched blocks into: {output_path}")
+    return matched_entries
 
 if __name__ == "__main__":
     # URLs passed as arguments via command line (e.g., python script.py http://url1.m3u http://url2.m3u)
@@ -0,0 +1,43 @@
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+# ===============================
+# ATOMIC WRITES
+# ===============================
+
+@contextmanager
+def atomic_write(path, mode="w", encoding="utf-8"):
+    """Yield a file that replaces path in one step when the block succeeds.
+
+    Everything goes to a temp file next to path, which is synced to disk
+    and made world-readable (mkstemp creates it 0600) before it is
+    renamed over path. If the block raises, path is left as it was.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_file = tempfile.mkstemp(dir=directory, prefix=".", suffix=".tmp")
+
+    try:
+        with os.fdopen(fd, mode, encoding=None if "b" in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.chmod(temp_file, 0o644)
+        os.replace(temp_file, path)
+    except BaseException:
+        os.unlink(temp_file)
+        raise
+
+# ===============================
+# JSON STATE FILES
+# ===============================
+
+def load_json(path):
+    """Contents of a JSON file, or {} if it is missing or unreadable."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
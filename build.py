@@ -0,0 +1,177 @@
+import functools
+import hashlib
+import importlib
+import os
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+
+import Cricket
+import customlist_mix
+import final_epg1
+from m3u_parser import parse_lines
+from playlist_cache import namespace_digest
+from playlist_fetch import PROCESSES
+from playlist_output import fetch_sources
+
+# ===============================
+# BUILD GRAPH
+# sources -> filters -> outputs
+#
+# customlist_mix.playlist_links        -> rules -> 8b249zhj3vg65us_mix.m3u
+# Cricket.text_links, .playlist_links  -> rules -> 8b249zhj3vg65us_sports.m3u
+# final_epg1.xmlGzUrl                  -> mapping, filters -> filtered.xml.gz
+#
+# Playlist sources are fetched together and a URL used by several
+# outputs is fetched once. The guide is built alongside them.
+# ===============================
+
+PLAYLIST_OUTPUTS = (customlist_mix, Cricket)
+
+def output_sources(output):
+    """{name: url} of one playlist output, in the order it writes them."""
+    return {**getattr(output, "text_links", {}), **output.playlist_links}
+
+def plan_sources(outputs):
+    """Group the sources of every output by URL: {url: [(output, name), ...]}."""
+    plan = {}
+    for output in outputs:
+        for name, url in output_sources(output).items():
+            plan.setdefault(url, []).append((output, name))
+    return plan
+
+def source_label(subscribers):
+    return ", ".join(f"{output.__name__} {name}" for output, name in subscribers)
+
+# ===============================
+# SHARED SOURCES
+# ===============================
+
+def read_shared(subscribers_by_label, label, lines):
+    """Run one source through every output that reads it.
+
+    subscribers_by_label maps each label to [(output module name, source
+    name), ...]; names rather than modules keep it picklable for worker
+    processes. Text sources get the output's own reader. Playlists are
+    parsed once and each entry is offered to every output's rules, as a
+    copy when more than one output may regroup it. Returns {(output name,
+    source name): result}.
+    """
+    subscribers = [
+        (importlib.import_module(module_name), name)
+        for module_name, name in subscribers_by_label[label]
+    ]
+    readers = [(output, name) for output, name in subscribers if name not in output.playlist_links]
+    matchers = [(output, name) for output, name in subscribers if name in output.playlist_links]
+    results = {}
+
+    if readers:
+        lines = list(lines)
+        for output, name in readers:
+            results[(output.__name__, name)] = output.read_source(name, iter(lines))
+
+    if matchers:
+        selected = {(output.__name__, name): [] for output, name in matchers}
+        for entry in parse_lines(lines):
+            for output, name in matchers:
+                candidate = entry.copy() if len(matchers) > 1 else entry
+                if output.rules.apply(name, candidate):
+                    selected[(output.__name__, name)].append(candidate)
+        results.update(selected)
+
+    return results
+
+def fetch_playlist_sources(outputs):
+    """Fetch every distinct source once; {output: {name: result}}."""
+    plan = plan_sources(outputs)
+    subscribers_by_label = {source_label(subscribers): subscribers for subscribers in plan.values()}
+
+    # Cached results depend on which outputs share each source, not only on the code
+    layout = repr(sorted(subscribers_by_label))
+    rules_files = sorted({output.rules_file for output in outputs})
+    namespace = namespace_digest(__file__, *rules_files) + hashlib.sha256(layout.encode()).hexdigest()
+
+    print(f"Fetching {len(plan)} sources for {len(outputs)} playlists...")
+
+    consume = functools.partial(read_shared, {
+        label: [(output.__name__, name) for output, name in subscribers]
+        for label, subscribers in subscribers_by_label.items()
+    })
+
+    fetched = fetch_sources(
+        {source_label(subscribers): url for url, subscribers in plan.items()},
+        consume,
+        namespace,
+        rules=[output.rules for output in outputs],
+        processes=PROCESSES
+    )
+
+    results = {}
+    for output in outputs:
+        results[output] = {}
+        for name, url in output_sources(output).items():
+            shared = fetched[source_label(plan[url])]
+            results[output][name] = shared[(output.__name__, name)] if shared is not None else None
+
+    return results
+
+# ===============================
+# STAGES
+# ===============================
+
+def build_playlists():
+    """Write every playlist; return whether any of them changed."""
+    failed = False
+    changed = False
+
+    for output, fetched in fetch_playlist_sources(PLAYLIST_OUTPUTS).items():
+        try:
+            changed = output.write_playlist(fetched) or changed
+        except Exception:
+            print(f"Failed to write {output.__name__}:")
+            traceback.print_exc()
+            failed = True
+
+    if failed:
+        raise RuntimeError("one or more playlists failed")
+    return changed
+
+def build_epg():
+    return final_epg1.main()
+
+STAGES = {
+    "playlists": build_playlists,
+    "epg": build_epg
+}
+
+def report_changed(changed):
+    """Tell a GitHub Actions job whether there is anything to commit."""
+    print("Outputs changed." if changed else "No output changed.")
+
+    github_output = os.environ.get("GITHUB_OUTPUT")
+    if github_output:
+        with open(github_output, "a", encoding="utf-8") as f:
+            f.write(f"changed={'true' if changed else 'false'}\n")
+
+def main():
+    """Run every stage concurrently; exit non-zero if any of them failed."""
+    with ThreadPoolExecutor(max_workers=len(STAGES)) as executor:
+        futures = {name: executor.submit(stage) for name, stage in STAGES.items()}
+
+    failed = []
+    changed = False
+    for name, future in futures.items():
+        try:
+            changed = future.result() or changed
+        except Exception:
+            print(f"Stage {name} failed:")
+            traceback.print_exc()
+            failed.append(name)
+
+    if failed:
+        sys.exit(1)
+
+    report_changed(changed)
+
+if __name__ == "__main__":
+    main()
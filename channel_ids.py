@@ -0,0 +1,81 @@
+import json
+
+from atomic_files import atomic_write, load_json
+from channel_rules import normalise
+from m3u_parser import parse_text
+
+# ===============================
+# IDS FILE
+# Format (JSON):
+# { output file: { "next": next free id, "ids": { channel key: tvg-id } } }
+# ===============================
+
+IDS_FILE = "channel_ids.json"
+
+# ===============================
+# ID REGISTRY
+# ===============================
+
+class ChannelIds:
+    """tvg-ids of one output file, kept stable across runs.
+
+    A channel keeps the id it was first given for as long as it appears
+    under the same name, whatever else changes upstream. New channels get
+    the next unused id and ids of channels that disappear are never
+    handed out again, so guide mappings on existing ids stay valid. The
+    first run seeds the registry from the numeric tvg-ids already in the
+    output file.
+    """
+
+    def __init__(self, output_file, ids_file=IDS_FILE):
+        self.output_file = output_file
+        self.ids_file = ids_file
+        self.occurrences = {}
+
+        state = load_json(ids_file).get(output_file)
+        if state is None:
+            state = {"next": 1, "ids": {}}
+            self.seed(state)
+
+        self.next = state["next"]
+        self.ids = state["ids"]
+
+    def key(self, name):
+        """Key for a channel name; repeats of a name in one run get #2, #3, ..."""
+        key = normalise(name)
+        count = self.occurrences.get(key, 0) + 1
+        self.occurrences[key] = count
+        return key if count == 1 else f"{key}#{count}"
+
+    def seed(self, state):
+        try:
+            with open(self.output_file, "r", encoding="utf-8") as f:
+                entries = list(parse_text(f.read()))
+        except OSError:
+            return
+
+        for entry in entries:
+            tvg_id = entry.get("tvg-id")
+            key = self.key(entry.name)
+            if tvg_id.isdigit() and key not in state["ids"]:
+                state["ids"][key] = tvg_id
+                state["next"] = max(state["next"], int(tvg_id) + 1)
+
+        self.occurrences = {}
+
+    def assign(self, name):
+        """Return the tvg-id for the next channel called name."""
+        key = self.key(name)
+        tvg_id = self.ids.get(key)
+        if tvg_id is None:
+            tvg_id = self.ids[key] = str(self.next)
+            self.next += 1
+        return tvg_id
+
+    def save(self):
+        data = load_json(self.ids_file)
+        data[self.output_file] = {"next": self.next, "ids": self.ids}
+
+        with atomic_write(self.ids_file) as f:
+            json.dump(data, f, indent=2, ensure_ascii=False)
+            f.write("\n")
@@ -0,0 +1,277 @@
+import copy
+import hashlib
+import os
+import pickle
+import re
+import sys
+
+from atomic_files import atomic_write
+
+# ===============================
+# RULES FILE
+# Format:
+# Channel Name : Link to Search : Group to Search : New Group
+#
+# Lines without a colon are section headers ("Music", "Movies", ...)
+# and are skipped like blank lines.
+# ===============================
+
+# Compiled rules, reused until the rules file or this module changes
+RULES_CACHE_DIR = os.path.join(".cache", "rules")
+
+def normalise(text):
+    """Lower-case text and collapse runs of whitespace to a single space."""
+    return " ".join(text.lower().split())
+
+def compile_alternation(values):
+    """One regex matching any of values as a substring, or None if there are none."""
+    if not values:
+        return None
+    ordered = sorted(set(values), key=len, reverse=True)
+    return re.compile("|".join(re.escape(value) for value in ordered))
+
+def parse_rule_lines(lines, rules_file="<rules>"):
+    """Yield (channel, link, group search, new group) for every rule line.
+
+    Raises ValueError for a line that has colons but is not a full rule.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if ":" not in line:
+            continue
+
+        parts = line.split(":", 3)
+        if len(parts) < 4 or not all(part.strip() for part in parts[:2] + parts[3:]):
+            raise ValueError(
+                f"{rules_file}:{number}: expected 'Channel Name : Link : Group to Search : New Group'"
+            )
+
+        yield (
+            normalise(parts[0]),
+            parts[1].strip(),
+            normalise(parts[2]),
+            parts[3].strip()
+        )
+
+# ===============================
+# PARTIAL MATCH INDEX
+# ===============================
+
+class PartialIndex:
+    """Rules of one partial-match link, indexed by character trigrams.
+
+    A rule matches when its channel name contains the channel's name or
+    is contained in it. Candidates come from trigram lookups and are then
+    checked with a plain substring test. When several rules match, an
+    exact name wins. Next comes a rule contained in the name, the longest
+    first. Then a rule containing the name, the shortest first. Remaining
+    ties go to file order.
+    """
+
+    def __init__(self):
+        self.rules = []
+        self.by_first_trigram = {}
+        self.by_trigram = {}
+        self.short = []
+
+    def add(self, rule_channel, rule_search, rule_replace):
+        index = len(self.rules)
+        self.rules.append((rule_channel, rule_search, rule_replace))
+
+        if len(rule_channel) < 3:
+            self.short.append(index)
+            return
+
+        self.by_first_trigram.setdefault(rule_channel[:3], []).append(index)
+        for trigram in {rule_channel[i:i + 3] for i in range(len(rule_channel) - 2)}:
+            self.by_trigram.setdefault(trigram, []).append(index)
+
+    def candidates(self, channel_name):
+        if len(channel_name) < 3:
+            return range(len(self.rules))
+
+        found = set(self.short)
+        # Rules inside the name start with one of the name's trigrams
+        for i in range(len(channel_name) - 2):
+            found.update(self.by_first_trigram.get(channel_name[i:i + 3], ()))
+        # Rules containing the name contain its first trigram
+        found.update(self.by_trigram.get(channel_name[:3], ()))
+        return found
+
+    def match(self, channel_name, group_title):
+        best = None
+
+        for index in self.candidates(channel_name):
+            rule_channel, rule_search, rule_replace = self.rules[index]
+            if rule_search not in group_title:
+                continue
+
+            if rule_channel == channel_name:
+                rank = (0, 0, index)
+            elif rule_channel in channel_name:
+                rank = (1, -len(rule_channel), index)
+            elif channel_name in rule_channel:
+                rank = (2, len(rule_channel), index)
+            else:
+                continue
+
+            if best is None or rank < best[0]:
+                best = (rank, rule_replace)
+
+        return best[1] if best else None
+
+# ===============================
+# COMPILED RULE INDEX
+# ===============================
+
+class RuleIndex:
+    """Rules parsed once and keyed by (link name, normalised channel name).
+
+    Every rule is indexed both for exact and for partial matching, so one
+    compiled index serves any set of partial-match links; the links that
+    match partially are picked with with_partial_links().
+    """
+
+    def __init__(self, rules, partial_links=()):
+        self.partial_links = frozenset(partial_links)
+        self.exact = {}
+        self.partial = {}
+
+        for rule_channel, rule_link, rule_search, rule_replace in rules:
+            self.partial.setdefault(rule_link, PartialIndex()).add(
+                rule_channel, rule_search, rule_replace
+            )
+            self.exact.setdefault((rule_link, rule_channel), []).append(
+                (rule_search, rule_replace)
+            )
+
+    def with_partial_links(self, partial_links):
+        """This index, matching the given links partially and the rest exactly."""
+        index = copy.copy(self)
+        index.partial_links = frozenset(partial_links)
+        return index
+
+    def match(self, link_name, channel_name, group_title):
+        """Return the new group for a channel, or None if no rule applies.
+
+        channel_name and group_title must already be normalised.
+        """
+        if link_name in self.partial_links:
+            index = self.partial.get(link_name)
+            return index.match(channel_name, group_title) if index else None
+
+        for rule_search, rule_replace in self.exact.get((link_name, channel_name), ()):
+            if rule_search in group_title:
+                return rule_replace
+        return None
+
+    def apply(self, link_name, entry):
+        """Move entry to the group of the rule it matches; False if none does."""
+        rule_replace = self.match(link_name, normalise(entry.name), normalise(entry.get("group-title")))
+        if rule_replace is None:
+            return False
+        entry.set("group-title", rule_replace)
+        return True
+
+def compile_rules(rules_file, partial_links=()):
+    """Read and validate a rules file and compile it into a RuleIndex."""
+    with open(rules_file, "r", encoding="utf-8") as f:
+        return RuleIndex(parse_rule_lines(f, rules_file), partial_links)
+
+# ===============================
+# COMPILED RULES CACHE
+# ===============================
+
+def file_sha256(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+def compiled_rules_file(rules_file, cache_dir):
+    """One artifact per rules file, whatever links match partially."""
+    name = os.path.splitext(os.path.basename(rules_file))[0]
+    return os.path.join(cache_dir, f"{name}.pickle")
+
+def save_compiled(path, compiled):
+    with atomic_write(path, "wb") as f:
+        pickle.dump(compiled, f, pickle.HIGHEST_PROTOCOL)
+
+def load_rules(rules_file, partial_links=(), cache_dir=RULES_CACHE_DIR):
+    """Return the RuleIndex of a rules file, compiling it only when it changed.
+
+    The compiled index is pickled under cache_dir. It is reused while the
+    rules file keeps its size and mtime, or failing that its hash, and
+    this module is unchanged. partial_links is applied on loading, so
+    every caller shares the one artifact.
+    """
+    artifact = compiled_rules_file(rules_file, cache_dir)
+    stat = os.stat(rules_file)
+    compiler = file_sha256(__file__)
+
+    try:
+        with open(artifact, "rb") as f:
+            compiled = pickle.load(f)
+    except Exception:
+        compiled = None
+
+    if compiled is not None and compiled["compiler"] == compiler:
+        if (compiled["mtime_ns"], compiled["size"]) == (stat.st_mtime_ns, stat.st_size):
+            return compiled["index"].with_partial_links(partial_links)
+
+        source = file_sha256(rules_file)
+        if compiled["source"] == source:
+            compiled.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+            save_compiled(artifact, compiled)
+            return compiled["index"].with_partial_links(partial_links)
+
+    index = compile_rules(rules_file)
+    save_compiled(artifact, {
+        "compiler": compiler,
+        "source": file_sha256(rules_file),
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        "index": index
+    })
+    return index.with_partial_links(partial_links)
+
+class RulesFile:
+    """The RuleIndex of a rules file, loaded on first use.
+
+    Scripts create one at import time without reading the file, so a bad
+    rule line only fails the playlists that use it. Call load() before
+    fetching to report it up front.
+    """
+
+    def __init__(self, rules_file, partial_links=()):
+        self.rules_file = rules_file
+        self.partial_links = frozenset(partial_links)
+        self.index = None
+
+    def load(self):
+        if self.index is None:
+            self.index = load_rules(self.rules_file, self.partial_links)
+        return self.index
+
+    def apply(self, link_name, entry):
+        return self.load().apply(link_name, entry)
+
+# ===============================
+# COMMAND LINE
+# python channel_rules.py [rules file]
+# Validates the file and refreshes its compiled artifact.
+# ===============================
+
+if __name__ == "__main__":
+    # Compile through the imported module so the pickle names channel_rules, not __main__
+    import channel_rules
+
+    rules_file = sys.argv[1] if len(sys.argv) > 1 else "allowed_channels.txt"
+
+    try:
+        index = channel_rules.load_rules(rules_file)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+
+    rules = sum(len(targets) for targets in index.exact.values())
+    links = len({link for link, _ in index.exact})
+    print(f"{rules_file}: {rules} rules for {links} links")
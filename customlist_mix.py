@@ -1,6 +1,12 @@
+import functools
 import os
-import re
-import requests
+
+from channel_ids import ChannelIds
+from channel_rules import RulesFile, normalise
+from playlist_cache import namespace_digest
+from playlist_fetch import PROCESSES
+from playlist_output import fetch_sources, select_entries, write_entries
+from stream_probe import first_live_copies
 
 # ===============================
 # PLAYLIST LINKS
@@ -13,6 +19,15 @@ playlist_links = {
     # "Link 12": os.environ["Rkd_Xtream_PLYLST_URL"]
 }
 
+# ===============================
+# SOURCE PRIORITY
+# A channel offered by several links is kept only from the first
+# link listed here whose stream is not dead; links not listed come
+# after, in the order above.
+# ===============================
+
+source_priority = ["Link 1", "Link 2", "Link 3"]
+
 # ===============================
 # OUTPUT FILE
 # ===============================
@@ -27,128 +42,69 @@ output_file = "8b249zhj3vg65us_mix.m3u"
 
 rules_file = "allowed_channels.txt"
 
+# Links whose rules match channel names partially instead of exactly
+partial_links = {"Link 12"}
+
 # ===============================
-# FETCH PLAYLIST
+# RULES (read on first use)
 # ===============================
 
-def fetch_playlist(url):
-    headers = {
-        "User-Agent": "Mozilla/5.0 IPTV Parser"
-    }
-    r = requests.get(url, headers=headers, timeout=30)
-    return r.text if r.status_code == 200 else ""
+rules = RulesFile(rules_file, partial_links)
 
 # ===============================
-# SPLIT EXTINF BLOCKS
+# ONE ENTRY PER CHANNEL
 # ===============================
 
-def split_blocks(content):
-    return re.split(r'(?=#EXTINF)', content)
+def ranked_entries(playlists):
+    """Yield the entries of every playlist, taking links by source_priority."""
+    ranked = [name for name in source_priority if name in playlists]
+    ranked += [name for name in playlists if name not in ranked]
 
-# ===============================
-# START OUTPUT FILE
-# ===============================
+    for link_name in ranked:
+        yield from playlists[link_name] or ()
 
-with open(output_file, "w", encoding="utf-8") as f:
-    f.write("#EXTM3U\n")
+def channel_copies(entries):
+    """Group entries by normalised channel name, keeping first-seen order."""
+    copies = {}
 
-# ===============================
-# LOAD RULES
-# ===============================
+    for entry in entries:
+        copies.setdefault(normalise(entry.name), []).append(entry)
 
-with open(rules_file, "r", encoding="utf-8") as f:
-    rules = [line.strip() for line in f if line.strip()]
+    return list(copies.values())
 
 # ===============================
-# PROCESS
+# WRITE OUTPUT
 # ===============================
-tvg_id = 1
-for link_name, url in playlist_links.items():
-
-    playlist = fetch_playlist(url)
-    if not playlist:
-        continue
 
-    blocks = split_blocks(playlist)
+def write_playlist(playlists):
+    """Give the deduplicated, live entries their tvg-ids and write the output file.
 
-    for block in blocks:
+    Returns whether the file changed.
+    """
+    ids = ChannelIds(output_file)
 
-        lines = block.strip().split("\n")
-        if not lines:
-            continue
+    # A channel whose preferred link is dead falls back to its next copy
+    entries = first_live_copies(channel_copies(ranked_entries(playlists)))
 
-        extinf_line = lines[0]
-        if not extinf_line.startswith("#EXTINF"):
-            continue
+    for entry in entries:
+        entry.set("tvg-id", ids.assign(entry.name), first=True)
 
-        # Extract channel name
-        channel_name = extinf_line.split(",")[-1].strip().lower()
-        channel_name = re.sub(r"\s+", " ", channel_name)
+    return write_entries(output_file, entries, ids)
 
-        # Extract group title
-        group_title = ""
-        match = re.search(r'group-title="([^"]+)"', extinf_line, re.IGNORECASE)
-        if match:
-            group_title = match.group(1).strip().lower()
-            group_title = re.sub(r"\s+", " ", group_title)
-
-        for rule in rules:
-
-            parts = rule.split(":", 3)
-            if len(parts) < 4:
-                continue
-
-            rule_channel = re.sub(r"\s+", " ", parts[0].strip().lower())
-            rule_link = parts[1].strip()
-            rule_search = re.sub(r"\s+", " ", parts[2].strip().lower())
-            rule_replace = parts[3].strip()
-
-            # Skip if rule belongs to another playlist
-            if rule_link != link_name:
-                continue
-
-            # Link 12 uses partial channel-name matching.
-            # All other links continue using exact matching.
-            if (
-                (
-                    (link_name == "Link 12" and
-                     (rule_channel in channel_name or channel_name in rule_channel))
-                    or
-                    (link_name != "Link 12" and channel_name == rule_channel)
-                )
-                and
-                rule_search in group_title
-            ):
-
-                new_extinf = re.sub(
-                    r'group-title="[^"]*"',
-                    f'group-title="{rule_replace}"',
-                    extinf_line,
-                    flags=re.IGNORECASE
-                )
-
-                # Add/replace tvg-id
-                if re.search(r'tvg-id="[^"]*"', new_extinf, re.IGNORECASE):
-                    new_extinf = re.sub(
-                        r'tvg-id="[^"]*"',
-                        f'tvg-id="{tvg_id}"',
-                        new_extinf,
-                        flags=re.IGNORECASE
-                    )
-                else:
-                    new_extinf = new_extinf.replace(
-                        "#EXTINF:-1",
-                        f'#EXTINF:-1 tvg-id="{tvg_id}"',
-                        1
-                    )
-                
-                tvg_id += 1
-
-                block = block.replace(extinf_line, new_extinf)
+# ===============================
+# FETCH, FILTER AND WRITE
+# ===============================
 
-                with open(output_file, "a", encoding="utf-8") as f:
-                    f.write(block.strip() + "\n\n")
+def main():
+    playlists = fetch_sources(
+        playlist_links,
+        functools.partial(select_entries, rules),
+        namespace_digest(__file__, rules_file),
+        rules=[rules],
+        processes=PROCESSES
+    )
 
-                break
+    return write_playlist(playlists)
 
-print(f"Playlist written to {output_file}")
+if __name__ == "__main__":
+    main()
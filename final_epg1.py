@@ -1,172 +1,531 @@
+import calendar
+import csv
 import gzip
+import hashlib
+import io
+import json
 import os
 import re
 import requests
-import shutil
+import struct
+import sys
+import time
+import zlib
+import xml.etree.ElementTree as ET
+from contextlib import contextmanager
+from xml.sax.saxutils import escape
+
+from atomic_files import atomic_write, load_json
+from programme_filters import load_filters
 
 # ==========================================================
 # Configuration
 # ==========================================================
 
 xmlGzUrl = "https://tsepg.cf/jio.xml.gz"  # Replace with your actual source URL
-localGzFile = "downloaded_epg.xml.gz"
-outputXmlFile = "filtered.xml"
 outputGzFile = "filtered.xml.gz"
 
-# Define multiple target channels and their new mapping IDs
-channelMapping = {
-    "jio-185": "31",
-    "jio-1668" : "300322",
-    "jio-289" : "47",
-  	"jio-156" : "17",
-  	"jio-3096" : "25",
-  	"jio-1113" : "3",
-  	"jio-165" : "30",	
-  	"jio-1477" : "52",
-  	"jio-3097" : "26",
-  	"jio-476111" : "2834",
-  	"jio-1136" : "9",
-  	"jio-1839" : "33",
-  	"jio-476111" : "1125",
-  	"jio-476111" : "1154",
-  	"jio-476111" : "1119",
-  	"jio-484" : "484",
-  	"jio-487" : "38",
-  	"jio-1691" : "1691",
-  	"jio-488" : "36",
-  	"jio-1358" : "12",
-  	"jio-153" : "16",	
-  	"jio-476111" : "1450",	
-  	"jio-476111" : "1763",
-  	"jio-2761" : "23",	
-  	"jio-415" : "34",
-  	"jio-1104" : "1",
-  	"jio-1110" : "2",
-  	"jio-762" : "51",
-  	"jio-1763" : "19",
-	"jio-1450" : "15"  	
-}
+# Keep programmes overlapping [now - keepPastHours, now + keepFutureHours].
+# The window edges snap to windowStepHours so that runs within the same
+# step produce identical output.
+keepPastHours = 6
+keepFutureHours = 48
+windowStepHours = 6
 
-# ==========================================================
-# Step 2a & 2b: Download the remote .xml.gz file
-# ==========================================================
+# XMLTV times without an explicit offset are UTC
+defaultUtcOffset = "+0000"
 
-print("Downloading source XML.GZ from URL...")
+# Title / category / channel / duration filters for dropping programmes
+programmeFiltersFile = "epg_filters.txt"
 
-response = requests.get(xmlGzUrl, stream=True)
-response.raise_for_status()
+# Local cache of the last downloaded guide and its HTTP validators
+cacheDir = os.path.join(".cache", "epg")
+cachedGzFile = os.path.join(cacheDir, "source.xml.gz")
+cacheStateFile = os.path.join(cacheDir, "state.json")
 
-with open(localGzFile, "wb") as fp:
-    for chunk in response.iter_content(chunk_size=8192):
-        if chunk:
-            fp.write(chunk)
+# Source guide channel id -> target ids, one row per target (CSV)
+channelMappingFile = "channel_mapping.csv"
+
+# Compression of outputGzFile. The gzip header is fixed (no file name,
+# mtime 0), so the same guide always gives the same bytes.
+# Compare settings on the current output with:
+#   python final_epg1.py --benchmark-gzip
+gzipLevel = 9
+gzipStrategy = zlib.Z_DEFAULT_STRATEGY
 
 # ==========================================================
 # Step 2c, 2d, 3 & Filter: Parse, Rename, and Filter Title
 # ==========================================================
 
-print("Parsing, skipping 'Movie' titles, and filtering records...")
+ELEMENT_START = re.compile(rb"<(channel|programme)(\s[^>]*)?>")
+ID_ATTRIBUTES = {
+    b"channel": re.compile(rb"""(?:^|\s)id=["']([^"']*)["']"""),
+    b"programme": re.compile(rb"""(?:^|\s)channel=["']([^"']*)["']"""),
+}
+CHUNK_SIZE = 1024 * 1024
+
+def iterXmltvElements(sourceHandle):
+    """Yield (tag, sourceId, elementBytes) for each <channel>/<programme>.
+
+    The guide is read in fixed-size chunks and scanned for element
+    boundaries, so tags may span lines (or the whole document may be one
+    line) and memory stays flat however large the guide is. Only the
+    start tag is inspected here; callers parse the elements they keep.
+    """
+    buffer = b""
+
+    while True:
+        chunk = sourceHandle.read(CHUNK_SIZE)
+        buffer += chunk
+        pos = 0
+
+        while True:
+            match = ELEMENT_START.search(buffer, pos)
+            if not match:
+                # Keep a possibly truncated start tag for the next chunk
+                cut = buffer.rfind(b"<", pos)
+                pos = cut if cut != -1 else len(buffer)
+                break
+
+            tag = match.group(1)
+            attributes = match.group(2) or b""
+
+            if attributes.endswith(b"/"):
+                end = match.end()
+            else:
+                closing = buffer.find(b"</" + tag + b">", match.end())
+                if closing == -1:
+                    pos = match.start()
+                    break
+                end = closing + len(tag) + 3
+
+            idMatch = ID_ATTRIBUTES[tag].search(attributes)
+            sourceId = idMatch.group(1).decode("utf-8", "ignore") if idMatch else ""
+
+            yield tag.decode(), sourceId, buffer[match.start():end]
+            pos = end
+
+        buffer = buffer[pos:]
+
+        if not chunk:
+            break
 
-with gzip.open(localGzFile, "rt", encoding="utf-8", errors="ignore") as sourceHandle, \
-     open(outputXmlFile, "w", encoding="utf-8") as outFile:
+# ==========================================================
+# Step 1: Load the channel mapping
+# ==========================================================
 
-    # Write XML headers
-    outFile.write('<?xml version="1.0" encoding="UTF-8"?>\n')
-    outFile.write("<tv>\n")
+def loadChannelMapping(path):
+    """Read source_id,target_id rows into {source id: [target ids]}."""
+    mapping = {}
+    owners = {}
+
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        for row in csv.DictReader(f):
+            sourceId = (row.get("source_id") or "").strip()
+            targetId = (row.get("target_id") or "").strip()
+            if not sourceId or not targetId:
+                continue
+
+            targets = mapping.setdefault(sourceId, [])
+            if targetId in targets:
+                continue
+
+            if owners.setdefault(targetId, sourceId) != sourceId:
+                print(f"Warning: target id {targetId} is mapped from both "
+                      f"{owners[targetId]} and {sourceId}; keeping {owners[targetId]}")
+                continue
+
+            targets.append(targetId)
+
+    return mapping
+
+PROGRAMME_TIMES = re.compile(rb"""\s(start|stop)=["'](\d{8,14})\s*([+-]\d{4})?""")
+
+def programmeWindow(now):
+    """Return the (start, end) epoch seconds of programmes worth keeping."""
+    step = windowStepHours * 3600
+    start = (int(now) - keepPastHours * 3600) // step * step
+    end = start + (keepPastHours + keepFutureHours) * 3600 + step
+    return start, end
+
+class FilterSettings:
+    """Channel mapping, programme window and programme filter of one run."""
+
+    def __init__(self, channelMapping, window, programmeFilter):
+        self.channelMapping = channelMapping
+        self.window = window
+        self.programmeFilter = programmeFilter
+
+def loadFilterSettings(now):
+    """Read the mapping and filter files and compute the window for now."""
+    return FilterSettings(
+        loadChannelMapping(channelMappingFile),
+        programmeWindow(now),
+        load_filters(programmeFiltersFile)
+    )
+
+def xmltvTimestamp(digits, offset):
+    """Convert XMLTV 'YYYYMMDDhhmmss' plus '+hhmm' offset to epoch seconds."""
+    digits = digits.ljust(14, b"0")
+    seconds = calendar.timegm((
+        int(digits[0:4]), int(digits[4:6]), int(digits[6:8]),
+        int(digits[8:10]), int(digits[10:12]), int(digits[12:14]),
+        0, 0, 0
+    ))
+
+    offset = offset or defaultUtcOffset.encode()
+    offsetSeconds = int(offset[1:3]) * 3600 + int(offset[3:5]) * 60
+    return seconds - offsetSeconds if offset[:1] == b"+" else seconds + offsetSeconds
+
+def programmeTimes(data):
+    """Return (start, stop) epoch seconds from a programme's start tag, or None."""
+    startTag = data[:data.find(b">")]
+    times = {}
+
+    for name, digits, offset in PROGRAMME_TIMES.findall(startTag):
+        try:
+            times[name] = xmltvTimestamp(digits, offset)
+        except ValueError:
+            return None
+
+    if b"start" not in times:
+        return None
+    return times[b"start"], times.get(b"stop", times[b"start"])
+
+def keepsProgramme(settings, sourceId, data):
+    """Apply the time window and the filters that need only the start tag.
+
+    Programmes with unreadable times are kept.
+    """
+    programmeFilter = settings.programmeFilter
+    if programmeFilter.drops_text("channel", (sourceId,)):
+        return False
+
+    times = programmeTimes(data)
+    if times is None:
+        return True
+
+    start, stop = times
+    windowStart, windowEnd = settings.window
+    return (
+        stop > windowStart and start < windowEnd
+        and not programmeFilter.drops_duration(stop - start)
+    )
+
+def xmlAttributes(attrib):
+    """Serialise an attribute dict as ' key="value" ...'."""
+    return "".join(
+        f' {key}="{escape(value, {chr(34): "&quot;"})}"'
+        for key, value in attrib.items()
+    )
+
+def parseElement(data):
+    """Parse the bytes of one element, or return None if they are not well-formed.
+
+    The upstream guide is not always clean. Invalid UTF-8 is dropped, as
+    the old line-by-line reader did, and an element that still does not
+    parse is logged and skipped rather than failing the whole guide.
+    """
+    try:
+        return ET.fromstring(data)
+    except ET.ParseError:
+        pass
+
+    try:
+        return ET.fromstring(data.decode("utf-8", "ignore"))
+    except ET.ParseError as e:
+        print(f"Skipping malformed element ({e}): {data[:80]!r}")
+        return None
+
+def parseChannel(data):
+    """Parse a source <channel> element ready for rendering; None if it is malformed."""
+    elem = parseElement(data)
+    if elem is not None:
+        ET.indent(elem, space="  ", level=1)
+        elem.tail = "\n"
+    return elem
+
+def parseProgramme(settings, data):
+    """Parse a source <programme> element; None if it is filtered out or malformed."""
+    elem = parseElement(data)
+    if elem is None:
+        return None
+
+    programmeFilter = settings.programmeFilter
+    if programmeFilter.drops_text("title", (title.text or "" for title in elem.findall("title"))):
+        return None
+    if programmeFilter.drops_text("category", (c.text or "" for c in elem.iter("category"))):
+        return None
+    return elem
+
+def renderChannel(targetId, elem):
+    """Serialise a parsed <channel> element under its new id."""
+    elem.set("id", targetId)
+    return "  " + ET.tostring(elem, encoding="unicode")
+
+def renderProgramme(targetId, elem):
+    """Serialise a parsed <programme> with its title only, under its new channel id."""
+    elem.set("channel", targetId)
+    parts = [f"  <programme{xmlAttributes(elem.attrib)}>\n"]
+
+    for title in elem.findall("title"):
+        parts.append(
+            f"    <title{xmlAttributes(title.attrib)}>"
+            f"{escape(title.text or '')}</title>\n"
+        )
+
+    parts.append("  </programme>\n")
+    return "".join(parts)
+
+def collectMappedElements(sourceHandle, settings):
+    """Group the raw bytes of every mapped <channel>/<programme> by source id."""
+    channels = {}
+    programmes = {}
+
+    for tag, sourceId, data in iterXmltvElements(sourceHandle):
+        if sourceId not in settings.channelMapping:
+            continue
 
-    inChannelBlock = False
-    channelBlockData = ""
+        programmes.setdefault(sourceId, [])
+        if tag == "channel":
+            channels.setdefault(sourceId, []).append(data)
+        elif keepsProgramme(settings, sourceId, data):
+            programmes[sourceId].append(data)
 
-    inTargetProgramme = False
-    programmeBuffer = ""
-    shouldSkipProgramme = False
+    return channels, programmes
 
-    # Read the uncompressed stream line by line
-    for line in sourceHandle:
+def filterEpg(sourceHandle, outFile, settings):
+    """Write the mapped subset of the XMLTV in sourceHandle to outFile.
 
-        # --------------------------------------------------
-        # 1. HANDLE CHANNELS (Keep completely intact)
-        # --------------------------------------------------
-        match = re.search(r'<channel\s+id="([^"]+)"', line)
-        if match:
-            sourceId = match.group(1)
+    Every mapped channel is rendered on each rebuild. Output from earlier
+    runs is not reused: each window step drops the oldest programmes of
+    every channel, and rendering is a small part of the scan anyway.
+    """
+    channels, programmes = collectMappedElements(sourceHandle, settings)
 
-            if sourceId in channelMapping:
-                inChannelBlock = True
-                line = re.sub(
-                    rf'id="{re.escape(sourceId)}"',
-                    f'id="{channelMapping[sourceId]}"',
-                    line
-                )
+    channelParts = []
+    programmeParts = []
 
-        if inChannelBlock:
-            channelBlockData += line
+    for sourceId, programmeData in programmes.items():
+        # Parse each source element once; only its id changes per target
+        channelElems = [elem for elem in map(parseChannel, channels.get(sourceId, [])) if elem is not None]
+        programmeElems = [
+            elem for elem in (parseProgramme(settings, data) for data in programmeData)
+            if elem is not None
+        ]
 
-            if "</channel>" in line:
-                outFile.write(channelBlockData)
-                inChannelBlock = False
-                channelBlockData = ""
+        # Each source channel fans out to every one of its target ids
+        for targetId in settings.channelMapping[sourceId]:
+            channelParts.extend(renderChannel(targetId, elem) for elem in channelElems)
+            programmeParts.extend(renderProgramme(targetId, elem) for elem in programmeElems)
 
-            continue
+    outFile.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+    outFile.write("<tv>\n")
+    outFile.write("".join(channelParts))
+    outFile.write("".join(programmeParts))
+    outFile.write("</tv>\n")
 
-        # --------------------------------------------------
-        # 2. HANDLE PROGRAMMES
-        # --------------------------------------------------
-        match = re.search(r'<programme\s+[^>]*channel="([^"]+)"', line)
+# ==========================================================
+# Step 3: Atomic output files
+# ==========================================================
 
-        if match:
-            sourceId = match.group(1)
+class KeepExisting(Exception):
+    """Raise inside atomicFile() to drop the new file and leave path as it is."""
+
+@contextmanager
+def atomicFile(path):
+    """Yield a binary file written to a temp file that replaces path on success."""
+    try:
+        with atomic_write(path, "wb") as rawFile:
+            yield rawFile
+    except KeepExisting:
+        pass
+
+class DeterministicGzip(io.RawIOBase):
+    """Write-only gzip stream whose header never changes.
+
+    gzip.GzipFile stores the file name and the current time in the
+    header, so identical guides compressed on different runs differ.
+    This writes the header by hand with neither, followed by a raw
+    deflate stream at the given level and zlib strategy.
+    """
+
+    def __init__(self, fileobj, level=gzipLevel, strategy=gzipStrategy):
+        self.fileobj = fileobj
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, -zlib.MAX_WBITS, 9, strategy)
+        self.crc = 0
+        self.size = 0
+
+        # Magic, deflate, no flags, mtime 0, extra flags, OS unknown
+        extraFlags = 2 if level == 9 else 4 if level == 1 else 0
+        fileobj.write(b"\x1f\x8b\x08\x00" + struct.pack("<IBB", 0, extraFlags, 255))
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += len(data)
+        self.fileobj.write(self.compressor.compress(data))
+        return len(data)
+
+    def close(self):
+        if not self.closed:
+            self.fileobj.write(self.compressor.flush())
+            self.fileobj.write(struct.pack("<II", self.crc, self.size & 0xFFFFFFFF))
+        super().close()
+
+@contextmanager
+def atomicGzipWriter(path):
+    """Yield a text stream gzipped into a temp file that replaces path on success."""
+    with atomicFile(path) as rawFile, \
+         DeterministicGzip(rawFile, gzipLevel, gzipStrategy) as gzFile, \
+         io.TextIOWrapper(io.BufferedWriter(gzFile, CHUNK_SIZE), encoding="utf-8") as outFile:
+        yield outFile
+
+class DigestWriter:
+    """Text stream wrapper hashing everything written through it."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.digest = hashlib.sha256()
+
+    def write(self, text):
+        self.digest.update(text.encode("utf-8"))
+        return self.stream.write(text)
 
-            if sourceId in channelMapping:
-                inTargetProgramme = True
-                shouldSkipProgramme = False
+# ==========================================================
+# Step 2a & 2b: Conditional download into the local cache
+# ==========================================================
 
-                cleanedOpeningLine = re.sub(
-                    rf'channel="{re.escape(sourceId)}"',
-                    f'channel="{channelMapping[sourceId]}"',
-                    line
-                )
+def saveCacheJson(path, data):
+    with atomic_write(path) as f:
+        json.dump(data, f, indent=2)
+
+def downloadSource(state):
+    """Refresh the cached guide unless the server reports it unchanged.
+
+    Returns the SHA-256 of the cached guide and updates state in place.
+    """
+    headers = {}
+    if state.get("url") == xmlGzUrl and os.path.exists(cachedGzFile):
+        if state.get("etag"):
+            headers["If-None-Match"] = state["etag"]
+        if state.get("lastModified"):
+            headers["If-Modified-Since"] = state["lastModified"]
+
+    with requests.get(xmlGzUrl, headers=headers, stream=True, timeout=60) as response:
+        if response.status_code == 304:
+            print("Source EPG not modified since the last run (HTTP 304).")
+            return state["sourceSha256"]
+
+        response.raise_for_status()
+
+        # Undo any transport Content-Encoding; the guide itself stays gzipped
+        response.raw.decode_content = True
+
+        digest = hashlib.sha256()
+        with atomicFile(cachedGzFile) as cacheFile:
+            for chunk in iter(lambda: response.raw.read(CHUNK_SIZE), b""):
+                digest.update(chunk)
+                cacheFile.write(chunk)
+
+        state.update(
+            url=xmlGzUrl,
+            etag=response.headers.get("ETag"),
+            lastModified=response.headers.get("Last-Modified"),
+            sourceSha256=digest.hexdigest()
+        )
+
+    return state["sourceSha256"]
+
+def settingsDigest(settings):
+    """Digest of the code, mapping and filters that shape the output."""
+    with open(__file__, "rb") as f:
+        digest = hashlib.sha256(f.read())
+    digest.update(repr(sorted(settings.channelMapping.items())).encode())
+    with open(programmeFiltersFile, "rb") as f:
+        digest.update(f.read())
+    return digest.hexdigest()
+
+def buildSignature(sourceSha256, settings):
+    """Identify an output by its guide, filter settings and time window."""
+    signature = sourceSha256 + settingsDigest(settings) + repr(settings.window)
+    return hashlib.sha256(signature.encode()).hexdigest()
 
-                programmeBuffer = "  " + cleanedOpeningLine.strip() + "\n"
+# ==========================================================
+# Run: download -> (skip if unchanged) -> filter -> gzip
+# ==========================================================
 
-        if inTargetProgramme:
+def main():
+    """Build the filtered guide; return whether outputGzFile changed."""
+    print("Downloading source XML.GZ from URL...")
 
-            # If the line contains a title tag, analyze it
-            if "<title" in line:
+    settings = loadFilterSettings(time.time())
 
-                if re.search(r'<title[^>]*>\s*Movie\s*</title>', line, re.IGNORECASE):
-                    shouldSkipProgramme = True
-                else:
-                    programmeBuffer += "    " + line.strip() + "\n"
+    state = load_json(cacheStateFile)
+    sourceSha256 = downloadSource(state)
+    saveCacheJson(cacheStateFile, state)
 
-            # Once we hit the closing tag
-            if "</programme>" in line:
+    signature = buildSignature(sourceSha256, settings)
 
-                if not shouldSkipProgramme:
-                    programmeBuffer += "  </programme>\n"
-                    outFile.write(programmeBuffer)
+    changed = False
 
-                inTargetProgramme = False
-                programmeBuffer = ""
-                shouldSkipProgramme = False
+    if state.get("outputSignature") == signature and os.path.exists(outputGzFile):
+        print(f"Source EPG unchanged; keeping existing {outputGzFile}.")
+    else:
+        print("Parsing, applying programme filters, and filtering records...")
 
-    outFile.write("</tv>\n")
+        with gzip.open(cachedGzFile, "rb") as sourceHandle, \
+             atomicGzipWriter(outputGzFile) as outFile:
+            hashedFile = DigestWriter(outFile)
+            filterEpg(sourceHandle, hashedFile, settings)
+            outputDigest = hashedFile.digest.hexdigest()
 
-# ==========================================================
-# Clean up temporary downloaded archive
-# ==========================================================
+            # A new source or window can still filter down to the same guide
+            changed = state.get("outputDigest") != outputDigest or not os.path.exists(outputGzFile)
+            if not changed:
+                print(f"Filtered EPG unchanged; keeping existing {outputGzFile}.")
+                raise KeepExisting()
 
-if os.path.exists(localGzFile):
-    os.remove(localGzFile)
+        state["outputSignature"] = signature
+        state["outputDigest"] = outputDigest
+        saveCacheJson(cacheStateFile, state)
+
+    print("Finished! Filtered EPG created successfully.")
+    return changed
 
 # ==========================================================
-# Step 3: Compress filtered.xml into filtered.xml.gz
+# Benchmark: compression settings on the current output
 # ==========================================================
 
-print(f"Compressing into {outputGzFile}...")
-
-with open(outputXmlFile, "rb") as xmlHandle:
-    with gzip.open(outputGzFile, "wb", compresslevel=6) as gzFile:
-        shutil.copyfileobj(xmlHandle, gzFile)
+GZIP_STRATEGIES = {
+    "default": zlib.Z_DEFAULT_STRATEGY,
+    "filtered": zlib.Z_FILTERED,
+}
 
-print("Finished! Filtered EPG created successfully.")
+def benchmarkGzip(path):
+    """Print size and time of every level/strategy for the guide in path."""
+    with gzip.open(path, "rb") as f:
+        data = f.read()
+
+    print(f"{path}: {len(data)} bytes uncompressed")
+    print(f"{'level':>5} {'strategy':>9} {'bytes':>10} {'ratio':>6} {'ms':>7}")
+
+    for level in range(1, 10):
+        for strategyName, strategy in GZIP_STRATEGIES.items():
+            out = io.BytesIO()
+            started = time.perf_counter()
+            with DeterministicGzip(out, level, strategy) as gzFile:
+                gzFile.write(data)
+            elapsed = (time.perf_counter() - started) * 1000
+
+            size = len(out.getvalue())
+            marker = "  <- current" if (level, strategy) == (gzipLevel, gzipStrategy) else ""
+            print(f"{level:>5} {strategyName:>9} {size:>10} {size / len(data):>6.3f} {elapsed:>7.1f}{marker}")
+
+if __name__ == "__main__":
+    if "--benchmark-gzip" in sys.argv[1:]:
+        benchmarkGzip(outputGzFile)
+    else:
+        main()
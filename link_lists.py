@@ -0,0 +1,62 @@
+# ===============================
+# LINK LISTS
+# Format (links.txt, channels.txt):
+# Title
+# URL[|drmScheme=clearkey&drmLicense=kid:key]
+# ===============================
+
+class StreamLink:
+    """One title/URL pair of a link list, with its clearkey license if any."""
+
+    __slots__ = ("title", "url", "license_key")
+
+    def __init__(self, title, url, license_key=""):
+        self.title = title
+        self.url = url
+        self.license_key = license_key
+
+def is_link(line):
+    return "://" in line
+
+def parse_pairs(lines, list_name="<links>"):
+    """Yield a StreamLink for every title line followed by a link line.
+
+    Blank lines are ignored. A title without a link or a link without a
+    title is reported and skipped, so one missing line does not shift
+    every later pair.
+    """
+    title = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if not is_link(line):
+            if title is not None:
+                print(f"{list_name}: '{title}' has no link, skipped")
+            title = line
+        elif title is None:
+            print(f"{list_name}: link without a title skipped: {line.split('|')[0]}")
+        else:
+            yield StreamLink(title, line)
+            title = None
+
+    if title is not None:
+        print(f"{list_name}: '{title}' has no link, skipped")
+
+def parse_links(lines, skip=0, list_name="<links>"):
+    """Yield the pairs after the first skip, with the license split off the URL."""
+    for index, pair in enumerate(parse_pairs(lines, list_name)):
+        if index < skip:
+            continue
+
+        url, _, options = pair.url.partition("|")
+        license_key = ""
+        for option in options.split("&"):
+            key, _, value = option.partition("=")
+            if key.strip() == "drmLicense":
+                license_key = value.strip()
+                break
+
+        yield StreamLink(pair.title, url.strip(), license_key)
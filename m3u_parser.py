@@ -0,0 +1,118 @@
+import re
+
+# ===============================
+# M3U ENTRY
+# ===============================
+
+class Entry:
+    """One #EXTINF entry: duration, attributes, name, directives and URL.
+
+    attrs keeps the #EXTINF attributes in their original order with
+    lower-cased keys. directives holds the other '#' lines of the entry
+    (#KODIPROP, #EXTVLCOPT, #EXTHTTP, ...) verbatim. A parsed entry also
+    keeps its #EXTINF line and the separator before the name, so it is
+    written back exactly as it came unless something changed it.
+    """
+
+    __slots__ = ("duration", "attrs", "name", "directives", "url", "separator", "extinf")
+
+    def __init__(self, duration="-1", attrs=None, name="", directives=None, url="",
+                 separator=", ", extinf=None):
+        self.duration = duration
+        self.attrs = attrs if attrs is not None else {}
+        self.name = name
+        self.directives = directives if directives is not None else []
+        self.url = url
+        self.separator = separator
+        self.extinf = extinf
+
+    def get(self, key, default=""):
+        return self.attrs.get(key, default)
+
+    def set(self, key, value, first=False):
+        """Set an attribute, adding it at the front when first and not yet present."""
+        if first and key not in self.attrs:
+            self.attrs = {key: value, **self.attrs}
+        else:
+            self.attrs[key] = value
+
+    def copy(self):
+        return Entry(
+            self.duration, dict(self.attrs), self.name, list(self.directives), self.url,
+            self.separator, self.extinf
+        )
+
+# ===============================
+# PARSER
+# ===============================
+
+EXTINF = re.compile(r'#EXTINF:\s*([-+]?[\d.]+)?((?:[^,"]|"[^"]*")*)(,?\s*)(.*)$')
+ATTRIBUTE = re.compile(r'([\w-]+)\s*=\s*(?:"([^"]*)"|([^\s,"]+))')
+
+def parse_extinf(line):
+    """Split an #EXTINF line into (duration, attrs, name, separator).
+
+    Attribute values may be quoted or not. separator is the comma and
+    any spaces between the attributes and the name.
+    """
+    match = EXTINF.match(line)
+    if not match:
+        return "-1", {}, "", ", "
+
+    duration, attributes, separator, name = match.groups()
+    attrs = {
+        key.lower(): quoted or unquoted
+        for key, quoted, unquoted in ATTRIBUTE.findall(attributes)
+    }
+    return duration or "-1", attrs, name.strip(), separator or ", "
+
+def parse_lines(lines):
+    """Yield an Entry for every #EXTINF block in an iterable of lines.
+
+    Lines before the first #EXTINF (the #EXTM3U header) are skipped. The
+    first non-'#' line of a block is its URL.
+    """
+    entry = None
+
+    for line in lines:
+        line = line.strip()
+        if not line:
+            continue
+
+        if line.startswith("#EXTINF"):
+            if entry is not None:
+                yield entry
+            duration, attrs, name, separator = parse_extinf(line)
+            entry = Entry(duration, attrs, name, separator=separator, extinf=line)
+        elif entry is None:
+            continue
+        elif line.startswith("#"):
+            entry.directives.append(line)
+        elif not entry.url:
+            entry.url = line
+
+    if entry is not None:
+        yield entry
+
+def parse_text(text):
+    return parse_lines(text.splitlines())
+
+# ===============================
+# SERIALIZER
+# ===============================
+
+def format_extinf(entry):
+    """The #EXTINF line of entry: verbatim if unchanged since parsing, else rebuilt."""
+    if entry.extinf is not None and parse_extinf(entry.extinf)[:3] == (entry.duration, entry.attrs, entry.name):
+        return entry.extinf
+
+    attributes = "".join(f' {key}="{value}"' for key, value in entry.attrs.items())
+    return f"#EXTINF:{entry.duration}{attributes}{entry.separator}{entry.name}"
+
+def format_entry(entry):
+    """Serialise an Entry back to M3U lines (without a trailing blank line)."""
+    lines = [format_extinf(entry)]
+    lines.extend(entry.directives)
+    if entry.url:
+        lines.append(entry.url)
+    return "\n".join(lines)
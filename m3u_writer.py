@@ -0,0 +1,83 @@
+import hashlib
+import re
+import time
+
+from atomic_files import atomic_write
+from m3u_parser import format_entry
+
+# ===============================
+# VOLATILE TOKENS
+# ===============================
+
+# CDN auth tokens that rotate on every fetch while the stream stays the same
+VOLATILE_TOKEN = re.compile(r"""((?:__hdnea__|__hdnts__|hdntl|hdnts)=)([^"'&|\s,]*)""")
+TOKEN_EXPIRY = re.compile(r"exp=(\d+)")
+
+# Republish before a published token expires within this many seconds,
+# so clients never sit on dead tokens until a real change comes along
+TOKEN_REFRESH_MARGIN = 12 * 3600
+
+def semantic_digest(text):
+    """Digest of a playlist with every volatile token blanked out."""
+    return hashlib.sha256(VOLATILE_TOKEN.sub(r"\1*", text).encode("utf-8")).hexdigest()
+
+def earliest_token_expiry(text):
+    """Earliest exp= timestamp of the volatile tokens in text, or None."""
+    expiries = [
+        int(expiry)
+        for token in VOLATILE_TOKEN.finditer(text)
+        for expiry in TOKEN_EXPIRY.findall(token.group(2))
+    ]
+    return min(expiries, default=None)
+
+def needs_rewrite(old_text, new_text, now):
+    """True unless new_text only differs from old_text in tokens that are still fresh."""
+    if old_text == new_text:
+        return False
+    if semantic_digest(old_text) != semantic_digest(new_text):
+        return True
+
+    expiry = earliest_token_expiry(old_text)
+    return expiry is not None and expiry < now + TOKEN_REFRESH_MARGIN
+
+# ===============================
+# PLAYLIST WRITER
+# ===============================
+
+class PlaylistWriter:
+    """Collect a playlist in memory and write it to disk in one atomic step.
+
+    Nothing touches output_file until commit(), which writes a temp file
+    next to it and renames it over the old one, so a run that dies
+    partway leaves the previous playlist in place. A playlist that only
+    differs from the existing file in fresh volatile tokens is not
+    written at all, which keeps unchanged runs out of git.
+    """
+
+    def __init__(self, output_file, header="#EXTM3U\n"):
+        self.output_file = output_file
+        self.parts = [header] if header else []
+
+    def write(self, text):
+        self.parts.append(text)
+
+    def write_entry(self, entry):
+        self.parts.append(format_entry(entry) + "\n\n")
+
+    def commit(self):
+        """Write the playlist if it changed; return whether it was written."""
+        text = "".join(self.parts)
+
+        try:
+            with open(self.output_file, "r", encoding="utf-8", newline="") as f:
+                old_text = f.read()
+        except OSError:
+            old_text = None
+
+        if old_text is not None and not needs_rewrite(old_text, text, time.time()):
+            return False
+
+        with atomic_write(self.output_file) as f:
+            f.write(text)
+
+        return True
@@ -0,0 +1,106 @@
+import glob
+import hashlib
+import os
+import pickle
+import sqlite3
+import time
+
+# ===============================
+# CACHE SETTINGS
+# ===============================
+
+CACHE_FILE = os.path.join(".cache", "playlists.sqlite")
+MAX_AGE_DAYS = 30
+
+def namespace_digest(*paths):
+    """Digest of the given data files plus every script and module in this folder.
+
+    Cached results are only valid for the code and rules that made them.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    digest = hashlib.sha256()
+
+    for path in list(paths) + sorted(glob.glob(os.path.join(here, "*.py"))):
+        digest.update(path.encode())
+        with open(path, "rb") as f:
+            digest.update(f.read())
+
+    return digest.hexdigest()
+
+# ===============================
+# CACHED SOURCE
+# ===============================
+
+class CachedSource:
+    __slots__ = ("etag", "last_modified", "content_sha256", "result")
+
+    def __init__(self, etag, last_modified, content_sha256, result):
+        self.etag = etag
+        self.last_modified = last_modified
+        self.content_sha256 = content_sha256
+        self.result = result
+
+# ===============================
+# PLAYLIST CACHE
+# ===============================
+
+class PlaylistCache:
+    """Per-source results of parsing and filtering, kept in SQLite between runs.
+
+    Rows are keyed by a hash of the namespace and the URL; the URL itself
+    is never stored because portal URLs carry credentials. Each row keeps
+    the HTTP validators and content hash the result was built from.
+    """
+
+    def __init__(self, namespace, cache_file=CACHE_FILE):
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        self.namespace = namespace
+        self.db = sqlite3.connect(cache_file)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS sources ("
+            " key TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_sha256 TEXT,"
+            " result BLOB,"
+            " updated REAL)"
+        )
+
+    def key(self, url):
+        return hashlib.sha256(f"{self.namespace}\0{url}".encode()).hexdigest()
+
+    def get(self, url):
+        row = self.db.execute(
+            "SELECT etag, last_modified, content_sha256, result FROM sources WHERE key = ?",
+            (self.key(url),)
+        ).fetchone()
+        if row is None:
+            return None
+
+        etag, last_modified, content_sha256, result = row
+        try:
+            return CachedSource(etag, last_modified, content_sha256, pickle.loads(result))
+        except Exception:
+            return None
+
+    def put(self, url, source):
+        self.db.execute(
+            "INSERT OR REPLACE INTO sources VALUES (?, ?, ?, ?, ?, ?)",
+            (
+                self.key(url),
+                source.etag,
+                source.last_modified,
+                source.content_sha256,
+                pickle.dumps(source.result, pickle.HIGHEST_PROTOCOL),
+                time.time()
+            )
+        )
+        self.db.commit()
+
+    def close(self):
+        self.db.execute(
+            "DELETE FROM sources WHERE updated < ?",
+            (time.time() - MAX_AGE_DAYS * 86400,)
+        )
+        self.db.commit()
+        self.db.close()
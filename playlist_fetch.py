@@ -0,0 +1,240 @@
+import codecs
+import hashlib
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from playlist_cache import CachedSource
+
+# ===============================
+# FETCH SETTINGS
+# ===============================
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 IPTV Parser"
+}
+
+CONNECT_TIMEOUT = 10    # seconds to open a connection
+SOURCE_TIMEOUT = 30     # seconds allowed for any single source
+TOTAL_TIMEOUT = 90      # seconds allowed for every source together
+MAX_WORKERS = 8
+CHUNK_SIZE = 64 * 1024
+
+# Worker processes for parsing and filtering sources; one core means threads
+PROCESSES = os.cpu_count() or 1
+
+class SourceTimeout(Exception):
+    pass
+
+# ===============================
+# SHARED SESSION
+# ===============================
+
+def make_session(pool_size=MAX_WORKERS):
+    """Create a session whose connection pool is shared by all workers."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers.update(HEADERS)
+    return session
+
+# ===============================
+# STREAM ONE SOURCE
+# ===============================
+
+def iter_chunks(response, digest, deadline, cancelled):
+    """Yield the raw body of response, feeding it to digest as it arrives.
+
+    Gives up once deadline passes or the run is cancelled.
+    """
+    for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+        if cancelled.is_set() or time.monotonic() > deadline:
+            raise SourceTimeout("deadline exceeded")
+        digest.update(chunk)
+        yield chunk
+
+def decode_lines(chunks, encoding):
+    """Split a stream of byte chunks into decoded lines.
+
+    Lines end at "\n" only, with a trailing "\r" stripped, so other
+    characters str.splitlines() treats as breaks stay inside the line.
+    """
+    decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+    pending = ""
+
+    for chunk in chunks:
+        lines = (pending + decoder.decode(chunk)).split("\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line[:-1] if line.endswith("\r") else line
+
+    text = pending + decoder.decode(b"", final=True)
+    if text:
+        yield text[:-1] if text.endswith("\r") else text
+
+def consume_source(session, name, url, consume, timeout, cancelled, cached=None):
+    """Stream url through consume and return a CachedSource for the result.
+
+    With a cached result the request is conditional: a 304, or a body
+    whose hash is unchanged when the server sends no validators, returns
+    None without parsing anything. Only the validators and hash of
+    cached are used.
+    """
+    deadline = time.monotonic() + timeout
+    headers = {}
+    if cached is not None:
+        if cached.etag:
+            headers["If-None-Match"] = cached.etag
+        if cached.last_modified:
+            headers["If-Modified-Since"] = cached.last_modified
+
+    with session.get(url, headers=headers, stream=True, timeout=(CONNECT_TIMEOUT, timeout)) as r:
+        if r.status_code == 304 and cached is not None:
+            return None
+        if r.status_code != 200:
+            raise requests.HTTPError(f"HTTP Status: {r.status_code}")
+
+        # Playlists without a declared charset are treated as UTF-8
+        content_type = r.headers.get("Content-Type", "")
+        if "charset" not in content_type.lower() or not r.encoding:
+            r.encoding = "utf-8"
+
+        etag = r.headers.get("ETag")
+        last_modified = r.headers.get("Last-Modified")
+        digest = hashlib.sha256()
+        chunks = iter_chunks(r, digest, deadline, cancelled)
+
+        if cached is None or etag or last_modified:
+            result = consume(name, decode_lines(chunks, r.encoding))
+            # Hash whatever consume left unread so the digest covers the whole body
+            for _ in chunks:
+                pass
+            return CachedSource(etag, last_modified, digest.hexdigest(), result)
+
+        # No validators: spool the body and only parse it if its hash changed
+        with tempfile.TemporaryFile() as spool:
+            for chunk in chunks:
+                spool.write(chunk)
+
+            if digest.hexdigest() == cached.content_sha256:
+                return None
+
+            spool.seek(0)
+            body = iter(lambda: spool.read(CHUNK_SIZE), b"")
+            result = consume(name, decode_lines(body, r.encoding))
+            return CachedSource(None, None, digest.hexdigest(), result)
+
+# ===============================
+# WORKER PROCESSES
+# ===============================
+
+class RunDeadline:
+    """Stands in for the cancel event when sources run in worker processes.
+
+    Events cannot be shared with a process pool, so each worker gets a
+    copy and stops on its own once the run's wall-clock deadline passes.
+    """
+
+    def __init__(self, expires):
+        self.expires = expires
+
+    def is_set(self):
+        return time.time() > self.expires
+
+    def set(self):
+        self.expires = 0
+
+process_session = None
+
+def consume_source_in_process(name, url, consume, timeout, cancelled, cached):
+    """consume_source() for a worker process, with one session per process."""
+    global process_session
+    if process_session is None:
+        process_session = make_session(1)
+    return consume_source(process_session, name, url, consume, timeout, cancelled, cached)
+
+# ===============================
+# STREAM ALL SOURCES
+# ===============================
+
+def stream_all(sources, consume, cache=None, processes=0,
+               source_timeout=SOURCE_TIMEOUT, total_timeout=TOTAL_TIMEOUT):
+    """Stream every {name: url} source concurrently through consume(name, lines).
+
+    consume runs on the worker thread while the response is still
+    arriving, so only what it returns is kept in memory. Returns
+    {name: result} in the order of sources; a source that fails or
+    misses its deadline maps to None.
+
+    With processes > 1 each source is fetched, parsed and filtered in a
+    pool of that many worker processes instead of threads, so the
+    CPU-bound matching uses every core. consume must then be a
+    module-level function and its result picklable.
+
+    With a PlaylistCache, results are stored per URL and reused for
+    sources that have not changed since the last run.
+    """
+    results = {name: None for name in sources}
+    if not sources:
+        return results
+
+    workers = min(len(sources), processes if processes > 1 else MAX_WORKERS)
+    if processes > 1:
+        # spawn: forking a process that may be running other threads is unsafe
+        executor = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("spawn"))
+        cancelled = RunDeadline(time.time() + total_timeout)
+    else:
+        executor = ThreadPoolExecutor(max_workers=workers)
+        cancelled = threading.Event()
+        session = make_session(workers)
+
+    try:
+        futures = {}
+        for name, url in sources.items():
+            cached = cache.get(url) if cache is not None else None
+            if processes > 1:
+                # Workers only need the validators, not the cached result
+                validators = cached and CachedSource(
+                    cached.etag, cached.last_modified, cached.content_sha256, None
+                )
+                future = executor.submit(
+                    consume_source_in_process, name, url, consume, source_timeout, cancelled, validators
+                )
+            else:
+                future = executor.submit(
+                    consume_source, session, name, url, consume, source_timeout, cancelled, cached
+                )
+            futures[future] = (name, url, cached)
+
+        done, not_done = wait(futures, timeout=total_timeout)
+        cancelled.set()
+
+        for future in done:
+            name, url, cached = futures[future]
+            try:
+                source = future.result()
+            except Exception as e:
+                print(f"Failed to fetch {name}: {e}")
+                continue
+
+            if source is None:
+                print(f"{name} unchanged, reusing cached result")
+                source = cached
+            if cache is not None:
+                cache.put(url, source)
+            results[name] = source.result
+
+        for future in not_done:
+            print(f"Failed to fetch {futures[future][0]}: global deadline exceeded")
+
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return results
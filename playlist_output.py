@@ -0,0 +1,56 @@
+from m3u_parser import parse_lines
+from m3u_writer import PlaylistWriter
+from playlist_cache import PlaylistCache
+from playlist_fetch import stream_all
+
+# ===============================
+# FETCH SOURCES
+# ===============================
+
+def fetch_sources(sources, consume, namespace, rules=(), processes=0):
+    """Stream every {name: url} source through consume; see stream_all().
+
+    The RulesFile objects in rules are loaded first, so a bad rule line
+    stops the run before anything is fetched instead of failing every
+    source. Results are reused for sources unchanged since a run with
+    the same cache namespace.
+    """
+    for rules_file in rules:
+        rules_file.load()
+
+    cache = PlaylistCache(namespace)
+    try:
+        return stream_all(sources, consume, cache=cache, processes=processes)
+    finally:
+        cache.close()
+
+# ===============================
+# MATCH ENTRIES AS THEY ARRIVE
+# ===============================
+
+def select_entries(rules, link_name, lines):
+    """Return the entries of a playlist stream that match a rule, regrouped."""
+    return [entry for entry in parse_lines(lines) if rules.apply(link_name, entry)]
+
+# ===============================
+# WRITE OUTPUT
+# ===============================
+
+def write_entries(output_file, entries, ids):
+    """Write entries to output_file and save the ids they were given.
+
+    Returns whether the file changed.
+    """
+    output = PlaylistWriter(output_file)
+
+    for entry in entries:
+        output.write_entry(entry)
+
+    changed = output.commit()
+    ids.save()
+
+    if changed:
+        print(f"Playlist written to {output_file}")
+    else:
+        print(f"{output_file} unchanged (ignoring rotated tokens); not rewritten")
+    return changed
@@ -0,0 +1,89 @@
+from channel_rules import compile_alternation, normalise
+
+# ===============================
+# FILTERS FILE
+# Format:
+# Field : Match : Value
+#
+# title, category, channel : is | contains : text
+# duration                 : under | over  : minutes
+#
+# A programme matching any line is dropped. Text matches ignore case
+# and repeated whitespace; channel is the source guide's channel id.
+# ===============================
+
+TEXT_FIELDS = ("title", "category", "channel")
+
+class ProgrammeFilter:
+    """Filter lines compiled into keyword sets, one regex per field and duration bounds."""
+
+    def __init__(self, rules):
+        exact = {field: set() for field in TEXT_FIELDS}
+        contains = {field: [] for field in TEXT_FIELDS}
+        self.min_minutes = None
+        self.max_minutes = None
+
+        for field, match, value in rules:
+            if field == "duration":
+                minutes = float(value)
+                if match == "under":
+                    if self.min_minutes is None or minutes > self.min_minutes:
+                        self.min_minutes = minutes
+                elif self.max_minutes is None or minutes < self.max_minutes:
+                    self.max_minutes = minutes
+            elif match == "is":
+                exact[field].add(normalise(value))
+            else:
+                contains[field].append(normalise(value))
+
+        self.exact = exact
+        self.patterns = {field: compile_alternation(contains[field]) for field in TEXT_FIELDS}
+
+    def drops_text(self, field, texts):
+        """True if any of texts (for title, category or channel) matches a filter."""
+        exact = self.exact[field]
+        pattern = self.patterns[field]
+        if not exact and pattern is None:
+            return False
+
+        for text in texts:
+            text = normalise(text)
+            if text in exact or (pattern is not None and pattern.search(text)):
+                return True
+        return False
+
+    def drops_duration(self, seconds):
+        minutes = seconds / 60
+        return (
+            (self.min_minutes is not None and minutes < self.min_minutes)
+            or (self.max_minutes is not None and minutes > self.max_minutes)
+        )
+
+def parse_filter_lines(lines, filters_file="<filters>"):
+    """Yield (field, match, value) for every filter line, rejecting malformed ones."""
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+
+        parts = [part.strip() for part in line.split(":", 2)]
+        if len(parts) < 3 or not parts[2]:
+            raise ValueError(f"{filters_file}:{number}: expected 'Field : Match : Value'")
+
+        field, match, value = parts[0].lower(), parts[1].lower(), parts[2]
+
+        if field in TEXT_FIELDS and match in ("is", "contains"):
+            yield field, match, value
+        elif field == "duration" and match in ("under", "over"):
+            try:
+                float(value)
+            except ValueError:
+                raise ValueError(f"{filters_file}:{number}: duration must be minutes") from None
+            yield field, match, value
+        else:
+            raise ValueError(f"{filters_file}:{number}: unknown filter '{field} : {match}'")
+
+def load_filters(filters_file):
+    """Read a filters file and compile it into a ProgrammeFilter."""
+    with open(filters_file, "r", encoding="utf-8") as f:
+        return ProgrammeFilter(list(parse_filter_lines(f, filters_file)))
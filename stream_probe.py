@@ -0,0 +1,278 @@
+import hashlib
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import unquote
+
+import requests
+
+from atomic_files import atomic_write, load_json
+from m3u_parser import Entry
+from m3u_writer import VOLATILE_TOKEN
+from playlist_fetch import make_session
+
+# ===============================
+# PROBE SETTINGS
+# ===============================
+
+PROBE_TIMEOUT = 5           # seconds allowed for each request to a stream
+PROBE_TOTAL_TIMEOUT = 60    # seconds allowed for probing every stream
+PROBE_WORKERS = 16
+
+# How long a result is trusted before the stream is probed again
+ALIVE_TTL = 6 * 3600
+DEAD_TTL = 3600
+
+PROBE_CACHE_FILE = os.path.join(".cache", "probe.json")
+
+# Streams answering 404/410 are dropped; set to True to list them
+# last instead. Streams that cannot be reached keep their place.
+DEMOTE_DEAD = False
+
+# Probe results. Only a definite "gone" from the server makes a stream
+# dead; a timeout, refused connection or 5xx makes it unreachable, which
+# may well be a passing failure on either side.
+ALIVE = "alive"
+DEAD = "dead"
+UNREACHABLE = "unreachable"
+
+# Statuses that mean the stream is gone rather than refused to us
+# (403s are usually geo or token checks the player will pass)
+DEAD_STATUSES = {404, 410}
+
+VLC_HEADERS = {
+    "#EXTVLCOPT:http-user-agent=": "User-Agent",
+    "#EXTVLCOPT:http-referrer=": "Referer",
+    "#EXTVLCOPT:http-origin=": "Origin"
+}
+
+# Kodi 'url|name=value&...' suffixes also carry player options such as
+# drmScheme/drmLicense; only these names (and X- headers) are sent
+PIPE_HEADERS = {
+    "user-agent", "referer", "origin", "cookie", "authorization",
+    "accept", "accept-language", "accept-encoding"
+}
+
+HEADER_NAME = re.compile(r"[!#$%&'*+.^_`|~0-9A-Za-z-]+")
+
+# ===============================
+# REQUEST OF AN ENTRY
+# ===============================
+
+def stream_request(entry):
+    """Return (url, headers) a player would use for entry.
+
+    Headers come from #EXTVLCOPT and #EXTHTTP directives and from
+    Kodi-style 'url|Header=value&...' suffixes. Headers that cannot be
+    sent as they are (not latin-1, or not a valid name) are left out.
+    """
+    url, _, options = entry.url.partition("|")
+    headers = {}
+
+    for directive in entry.directives:
+        for prefix, header in VLC_HEADERS.items():
+            if directive.startswith(prefix):
+                headers[header] = directive[len(prefix):].strip()
+        if directive.startswith("#EXTHTTP:"):
+            try:
+                headers.update({str(k): str(v) for k, v in json.loads(directive[9:]).items()})
+            except (ValueError, AttributeError):
+                pass
+
+    for option in options.split("&"):
+        key, _, value = option.partition("=")
+        key = key.strip()
+        if value and (key.lower() in PIPE_HEADERS or key.lower().startswith("x-")):
+            headers[key] = unquote(value)
+
+    return url.strip(), {
+        name: value for name, value in headers.items() if is_sendable(name, value)
+    }
+
+def is_sendable(name, value):
+    if not HEADER_NAME.fullmatch(name) or "\r" in value or "\n" in value:
+        return False
+    try:
+        value.encode("latin-1")
+    except UnicodeEncodeError:
+        return False
+    return True
+
+# ===============================
+# PROBE ONE STREAM
+# ===============================
+
+def status_result(status_code):
+    if status_code in DEAD_STATUSES:
+        return DEAD
+    return UNREACHABLE if status_code >= 500 else ALIVE
+
+def probe(session, url, headers, timeout=PROBE_TIMEOUT):
+    """ALIVE, DEAD when url answers 404/410, or UNREACHABLE on errors and 5xx.
+
+    Tries HEAD first. Many stream servers reject or mishandle HEAD, so
+    any error status is confirmed with a GET for the first byte. Any
+    failure other than a request error says nothing about the stream,
+    which then counts as alive.
+    """
+    try:
+        with session.head(url, headers=headers, timeout=timeout, allow_redirects=True) as r:
+            if r.status_code < 400:
+                return ALIVE
+
+        ranged = {**headers, "Range": "bytes=0-0"}
+        with session.get(url, headers=ranged, timeout=timeout, stream=True) as r:
+            return status_result(r.status_code)
+
+    except requests.RequestException:
+        return UNREACHABLE
+    except Exception as e:
+        print(f"Could not probe {url.split('?')[0]}: {e!r}")
+        return ALIVE
+
+# ===============================
+# PROBE CACHE
+# ===============================
+
+def probe_key(url, headers):
+    """Cache key of a request; stream URLs carry tokens, so only a hash is stored.
+
+    Volatile tokens are blanked first: they rotate on every playlist
+    fetch while the stream behind them stays the same.
+    """
+    request = VOLATILE_TOKEN.sub(r"\1*", json.dumps([url, sorted(headers.items())]))
+    return hashlib.sha256(request.encode()).hexdigest()
+
+def is_fresh(result, now):
+    ttl = {ALIVE: ALIVE_TTL, DEAD: DEAD_TTL}.get(result.get("state"))
+    return ttl is not None and now - result["checked"] < ttl
+
+# ===============================
+# PROBE MANY STREAMS
+# ===============================
+
+def probe_requests(requests_to_probe, cache_file=PROBE_CACHE_FILE,
+                   timeout=PROBE_TIMEOUT, total_timeout=PROBE_TOTAL_TIMEOUT):
+    """Probe [(url, headers), ...] concurrently; return a list of results.
+
+    Results younger than their TTL are taken from cache_file, and each
+    distinct request is probed once. Unreachable results are not cached,
+    so those streams are tried again on the next run. Streams not probed
+    before total_timeout count as alive.
+    """
+    now = time.time()
+    cache = {
+        key: result for key, result in load_json(cache_file).items()
+        if is_fresh(result, now)
+    }
+
+    keys = [probe_key(url, headers) for url, headers in requests_to_probe]
+    results = {key: result["state"] for key, result in cache.items()}
+    pending = {}
+    for key, request in zip(keys, requests_to_probe):
+        if key not in results and key not in pending:
+            pending[key] = request
+
+    if pending:
+        workers = min(len(pending), PROBE_WORKERS)
+        session = make_session(workers)
+        executor = ThreadPoolExecutor(max_workers=workers)
+
+        try:
+            futures = {
+                executor.submit(probe, session, url, headers, timeout): key
+                for key, (url, headers) in pending.items()
+            }
+            done, not_done = wait(futures, timeout=total_timeout)
+
+            for future in done:
+                key = futures[future]
+                results[key] = future.result()
+                if results[key] != UNREACHABLE:
+                    cache[key] = {"state": results[key], "checked": now}
+
+            if not_done:
+                print(f"Probe deadline exceeded; {len(not_done)} streams left unchecked")
+
+        finally:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        with atomic_write(cache_file) as f:
+            json.dump(cache, f)
+
+    return [results.get(key, ALIVE) for key in keys]
+
+def first_live_copies(copies, demote=DEMOTE_DEAD, cache_file=PROBE_CACHE_FILE,
+                      total_timeout=PROBE_TOTAL_TIMEOUT):
+    """Pick one entry from each list of copies of a channel, best first.
+
+    The first copy of every channel is probed, all together; the next
+    copy of a channel is probed only when the one before it is dead, so
+    backups are never touched while the preferred link works. Unreachable
+    copies are kept, like live ones. A channel whose copies are all dead
+    is dropped or, with demote, listed after the others by its first copy.
+    Otherwise channels keep their order.
+    """
+    copies = [list(entries) for entries in copies]
+    chosen = [None] * len(copies)
+    tried = [0] * len(copies)
+    undecided = [i for i, entries in enumerate(copies) if entries]
+    deadline = time.monotonic() + total_timeout
+
+    while undecided:
+        states = probe_requests(
+            [stream_request(copies[i][tried[i]]) for i in undecided],
+            cache_file,
+            total_timeout=max(deadline - time.monotonic(), 0)
+        )
+        next_round = []
+
+        for i, state in zip(undecided, states):
+            entry = copies[i][tried[i]]
+            if state == DEAD:
+                print(f"Dead stream: {entry.name}")
+                tried[i] += 1
+                if tried[i] < len(copies[i]):
+                    next_round.append(i)
+            else:
+                if state == UNREACHABLE:
+                    print(f"Unreachable stream, kept: {entry.name}")
+                chosen[i] = entry
+
+        undecided = next_round
+
+    kept = [entry for entry in chosen if entry is not None]
+    dead = [entries[0] for entries, entry in zip(copies, chosen) if entries and entry is None]
+    return kept + dead if demote else kept
+
+def sort_out_dead(entries, demote=DEMOTE_DEAD, cache_file=PROBE_CACHE_FILE):
+    """Probe the streams of an iterable of entries and drop the dead ones.
+
+    Live and unreachable entries keep their original order; a network
+    blip must not reshuffle the playlist. With demote, dead entries are
+    kept too, after the others.
+    """
+    return first_live_copies([[entry] for entry in entries], demote, cache_file)
+
+# ===============================
+# COMMAND LINE
+# python stream_probe.py URL[|Header=value&...] ...
+# ===============================
+
+if __name__ == "__main__":
+    urls = sys.argv[1:]
+    # Always probe afresh from the command line
+    with tempfile.TemporaryDirectory() as directory:
+        states = probe_requests(
+            [stream_request(Entry(url=url)) for url in urls],
+            os.path.join(directory, "probe.json")
+        )
+
+    for url, state in zip(urls, states):
+        print(f"{state:<11}  {url}")
+
+    sys.exit(1 if DEAD in states else 0)
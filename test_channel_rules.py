@@ -0,0 +1,93 @@
+import unittest
+
+from channel_rules import PartialIndex, RuleIndex, parse_rule_lines
+
+def partial_index(*rules):
+    index = PartialIndex()
+    for rule_channel, rule_replace in rules:
+        index.add(rule_channel, "", rule_replace)
+    return index
+
+class PartialIndexRankingTest(unittest.TestCase):
+
+    def test_exact_match_wins(self):
+        index = partial_index(
+            ("star sports", "contained"),
+            ("star sports 1 hd", "containing"),
+            ("star sports 1", "exact")
+        )
+        self.assertEqual(index.match("star sports 1", ""), "exact")
+
+    def test_longest_contained_rule_wins(self):
+        index = partial_index(
+            ("star", "short"),
+            ("star sports 1", "longest"),
+            ("star sports", "middle")
+        )
+        self.assertEqual(index.match("star sports 1 hd", ""), "longest")
+
+    def test_contained_rule_beats_containing_rule(self):
+        index = partial_index(
+            ("star sports 1 hd", "containing"),
+            ("sports", "contained")
+        )
+        self.assertEqual(index.match("star sports 1", ""), "contained")
+
+    def test_shortest_containing_rule_wins(self):
+        index = partial_index(
+            ("sony ten 1 hd", "longer"),
+            ("sony ten", "shortest"),
+            ("sony ten 1", "middle")
+        )
+        self.assertEqual(index.match("sony", ""), "shortest")
+
+    def test_file_order_breaks_ties(self):
+        index = partial_index(
+            ("zee tv", "first"),
+            ("zee tv", "second"),
+            ("news 24", "first contained"),
+            ("news 18", "second contained")
+        )
+        self.assertEqual(index.match("zee tv", ""), "first")
+        self.assertEqual(index.match("news 18 news 24", ""), "first contained")
+
+    def test_group_search_must_match(self):
+        index = PartialIndex()
+        index.add("star sports 1", "cricket", "Cricket")
+        index.add("star sports", "", "Sports")
+        self.assertEqual(index.match("star sports 1", "cricket live"), "Cricket")
+        self.assertEqual(index.match("star sports 1", "football"), "Sports")
+
+    def test_names_shorter_than_a_trigram(self):
+        index = partial_index(("tv", "short rule"), ("hd plus", "long rule"))
+        self.assertEqual(index.match("abc tv", ""), "short rule")
+        self.assertEqual(index.match("hd", ""), "long rule")
+        self.assertIsNone(index.match("xyz", ""))
+
+class RuleIndexTest(unittest.TestCase):
+
+    RULES = [
+        "Sports",
+        "Star Sports 1 : Link 1 : : Cricket",
+        "Star Sports 1 : Link 2 : cricket : Cricket",
+        "Star Sports : Link 2 : : Sports"
+    ]
+
+    def test_exact_links_need_the_whole_name(self):
+        index = RuleIndex(parse_rule_lines(self.RULES))
+        self.assertEqual(index.match("Link 1", "star sports 1", ""), "Cricket")
+        self.assertIsNone(index.match("Link 1", "star sports 1 hd", ""))
+        self.assertIsNone(index.match("Link 2", "star sports 1", "football"))
+
+    def test_with_partial_links(self):
+        index = RuleIndex(parse_rule_lines(self.RULES)).with_partial_links({"Link 2"})
+        self.assertEqual(index.match("Link 2", "star sports 1 hd", "cricket"), "Cricket")
+        self.assertEqual(index.match("Link 2", "star sports 1 hd", "football"), "Sports")
+        self.assertIsNone(index.match("Link 1", "star sports 1 hd", ""))
+
+    def test_incomplete_rule_is_an_error(self):
+        with self.assertRaises(ValueError):
+            list(parse_rule_lines(["Star Sports : Link 1"]))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,107 @@
+import calendar
+import io
+import unittest
+from unittest import mock
+
+import final_epg1
+
+# ===============================
+# SAMPLE GUIDE
+# Start tags spanning lines, a self-closing programme and text that
+# only looks like a tag
+# ===============================
+
+GUIDE = b"""<?xml version="1.0" encoding="UTF-8"?>
+<tv generator-info-name="test">
+  <channel
+      id="ch.one">
+    <display-name>One &lt;HD&gt;</display-name>
+  </channel>
+  <channel id='ch.two'><display-name>Two</display-name></channel>
+  <programme start="20240101060000 +0530"
+             stop="20240101070000 +0530"
+             channel="ch.one">
+    <title>Morning &amp; News</title>
+  </programme>
+  <programme start="20240101070000 +0530" stop="20240101073000 +0530" channel="ch.one"/>
+  <programme channel="ch.two" start="20240101000000" stop="20240101010000">
+    <title>&lt;programme channel="fake"&gt;</title>
+  </programme>
+</tv>
+"""
+
+EXPECTED = [
+    ("channel", "ch.one"),
+    ("channel", "ch.two"),
+    ("programme", "ch.one"),
+    ("programme", "ch.one"),
+    ("programme", "ch.two")
+]
+
+def elements(data):
+    return list(final_epg1.iterXmltvElements(io.BytesIO(data)))
+
+def utc(*fields):
+    return calendar.timegm(fields + (0, 0, 0))
+
+class IterXmltvElementsTest(unittest.TestCase):
+
+    def test_multi_line_start_tags(self):
+        found = elements(GUIDE)
+        self.assertEqual([(tag, sourceId) for tag, sourceId, _ in found], EXPECTED)
+        self.assertTrue(found[0][2].startswith(b"<channel\n      id=\"ch.one\">"))
+        self.assertTrue(found[0][2].endswith(b"</channel>"))
+        self.assertTrue(found[2][2].endswith(b"</programme>"))
+
+    def test_one_line_document(self):
+        oneLine = b" ".join(line.strip() for line in GUIDE.splitlines())
+        found = elements(oneLine)
+        self.assertEqual([(tag, sourceId) for tag, sourceId, _ in found], EXPECTED)
+        self.assertEqual(found[1][2], b"<channel id='ch.two'><display-name>Two</display-name></channel>")
+
+    def test_self_closing_programme(self):
+        found = elements(GUIDE)
+        self.assertEqual(
+            found[3][2],
+            b'<programme start="20240101070000 +0530" stop="20240101073000 +0530" channel="ch.one"/>'
+        )
+
+    def test_elements_split_across_chunks(self):
+        expected = elements(GUIDE)
+
+        for size in (1, 2, 3, 7, 16, 40):
+            with self.subTest(chunkSize=size), mock.patch.object(final_epg1, "CHUNK_SIZE", size):
+                self.assertEqual(elements(GUIDE), expected)
+
+    def test_every_element_is_well_formed(self):
+        for _, _, data in elements(GUIDE):
+            self.assertIsNotNone(final_epg1.parseElement(data))
+
+class ProgrammeTimesTest(unittest.TestCase):
+
+    def test_offsets_are_applied(self):
+        data = elements(GUIDE)[2][2]
+        self.assertEqual(final_epg1.programmeTimes(data), (utc(2024, 1, 1, 0, 30, 0), utc(2024, 1, 1, 1, 30, 0)))
+
+    def test_missing_offset_is_utc(self):
+        data = elements(GUIDE)[4][2]
+        self.assertEqual(final_epg1.programmeTimes(data), (utc(2024, 1, 1, 0, 0, 0), utc(2024, 1, 1, 1, 0, 0)))
+
+    def test_self_closing_programme(self):
+        data = elements(GUIDE)[3][2]
+        self.assertEqual(final_epg1.programmeTimes(data), (utc(2024, 1, 1, 1, 30, 0), utc(2024, 1, 1, 2, 0, 0)))
+
+    def test_missing_stop_ends_at_start(self):
+        data = b'<programme start="20240101000000 -0100" channel="x"><title>T</title></programme>'
+        self.assertEqual(final_epg1.programmeTimes(data), (utc(2024, 1, 1, 1, 0, 0),) * 2)
+
+    def test_only_the_start_tag_is_read(self):
+        data = b'<programme channel="x"><desc> start="20240101000000"</desc></programme>'
+        self.assertIsNone(final_epg1.programmeTimes(data))
+
+    def test_unreadable_times(self):
+        data = b'<programme start="20241399000000" channel="x"></programme>'
+        self.assertIsNone(final_epg1.programmeTimes(data))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,162 @@
+import os
+import socket
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import stream_probe
+from m3u_parser import Entry
+from playlist_fetch import make_session
+
+# ===============================
+# STUB STREAM SERVER
+# /ok            200
+# /head-refused  405 to HEAD, 206 to GET
+# /gone          404
+# /error         503
+# /forbidden     403
+# ===============================
+
+STATUSES = {
+    "/ok": 200,
+    "/gone": 404,
+    "/error": 503,
+    "/forbidden": 403
+}
+
+class StubHandler(BaseHTTPRequestHandler):
+    def respond(self):
+        path = self.path.split("?")[0]
+        self.server.hits.append((self.command, path, self.headers.get("Range")))
+
+        if path == "/head-refused":
+            status = 405 if self.command == "HEAD" else 206
+        else:
+            status = STATUSES.get(path, 404)
+
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    do_HEAD = respond
+    do_GET = respond
+
+    def log_message(self, *args):
+        pass
+
+def closed_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+class StreamProbeTest(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        cls.server.hits = []
+        cls.base = f"http://127.0.0.1:{cls.server.server_port}"
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self):
+        self.server.hits.clear()
+        self.session = make_session(1)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache_file = os.path.join(directory.name, "probe.json")
+
+    def probe(self, path):
+        return stream_probe.probe(self.session, self.base + path, {}, timeout=2)
+
+    def test_ok_is_alive_from_head_alone(self):
+        self.assertEqual(self.probe("/ok"), stream_probe.ALIVE)
+        self.assertEqual([hit[0] for hit in self.server.hits], ["HEAD"])
+
+    def test_head_refused_is_confirmed_with_ranged_get(self):
+        self.assertEqual(self.probe("/head-refused"), stream_probe.ALIVE)
+        self.assertEqual(self.server.hits, [
+            ("HEAD", "/head-refused", None),
+            ("GET", "/head-refused", "bytes=0-0")
+        ])
+
+    def test_not_found_is_dead(self):
+        self.assertEqual(self.probe("/gone"), stream_probe.DEAD)
+
+    def test_server_error_is_unreachable(self):
+        self.assertEqual(self.probe("/error"), stream_probe.UNREACHABLE)
+
+    def test_forbidden_is_alive(self):
+        self.assertEqual(self.probe("/forbidden"), stream_probe.ALIVE)
+
+    def test_refused_connection_is_unreachable(self):
+        url = f"http://127.0.0.1:{closed_port()}/live"
+        self.assertEqual(stream_probe.probe(self.session, url, {}, timeout=2), stream_probe.UNREACHABLE)
+
+    def test_unsendable_header_does_not_crash(self):
+        entry = Entry(name="UA", url=self.base + "/ok", directives=["#EXTVLCOPT:http-user-agent=Mozilla ✓ TV"])
+        kept = stream_probe.sort_out_dead([entry], cache_file=self.cache_file)
+        self.assertEqual(kept, [entry])
+
+    def test_drm_options_are_not_sent_as_headers(self):
+        entry = Entry(url="http://cdn/x.mpd|drmScheme=clearkey&drmLicense=kid:key&User-Agent=Player%2F1")
+        self.assertEqual(stream_probe.stream_request(entry), ("http://cdn/x.mpd", {"User-Agent": "Player/1"}))
+
+    def test_sort_out_dead_drops_dead_and_keeps_unreachable_in_place(self):
+        entries = [
+            Entry(name="unreachable", url=f"http://127.0.0.1:{closed_port()}/live"),
+            Entry(name="gone", url=self.base + "/gone"),
+            Entry(name="ok", url=self.base + "/ok")
+        ]
+        kept = stream_probe.sort_out_dead(entries, cache_file=self.cache_file)
+        self.assertEqual([entry.name for entry in kept], ["unreachable", "ok"])
+
+        demoted = stream_probe.sort_out_dead(entries, demote=True, cache_file=self.cache_file)
+        self.assertEqual([entry.name for entry in demoted], ["unreachable", "ok", "gone"])
+
+    def test_backup_copies_are_probed_only_when_needed(self):
+        copies = [
+            [Entry(name="first", url=self.base + "/ok"), Entry(name="first backup", url=self.base + "/forbidden")],
+            [Entry(name="second", url=self.base + "/gone"), Entry(name="second backup", url=self.base + "/head-refused")],
+            [Entry(name="third", url=self.base + "/gone")]
+        ]
+        kept = stream_probe.first_live_copies(copies, cache_file=self.cache_file)
+        self.assertEqual([entry.name for entry in kept], ["first", "second backup"])
+        self.assertNotIn("/forbidden", [hit[1] for hit in self.server.hits])
+
+        demoted = stream_probe.first_live_copies(copies, demote=True, cache_file=self.cache_file)
+        self.assertEqual([entry.name for entry in demoted], ["first", "second backup", "third"])
+
+    def test_cached_results_are_not_probed_again(self):
+        requests_to_probe = [(self.base + path, {}) for path in ("/ok", "/gone", "/forbidden")]
+        first = stream_probe.probe_requests(requests_to_probe, self.cache_file)
+        self.assertTrue(self.server.hits)
+
+        self.server.hits.clear()
+        second = stream_probe.probe_requests(requests_to_probe, self.cache_file)
+        self.assertEqual(second, first)
+        self.assertEqual(self.server.hits, [])
+
+    def test_server_errors_are_not_cached(self):
+        stream_probe.probe_requests([(self.base + "/error", {})], self.cache_file)
+
+        self.server.hits.clear()
+        stream_probe.probe_requests([(self.base + "/error", {})], self.cache_file)
+        self.assertTrue(self.server.hits)
+
+    def test_rotated_tokens_hit_the_cache(self):
+        url = self.base + "/ok?__hdnea__=st=1~exp=2~hmac=aa"
+        stream_probe.probe_requests([(url, {})], self.cache_file)
+
+        self.server.hits.clear()
+        rotated = self.base + "/ok?__hdnea__=st=3~exp=4~hmac=bb"
+        self.assertEqual(stream_probe.probe_requests([(rotated, {})], self.cache_file), [stream_probe.ALIVE])
+        self.assertEqual(self.server.hits, [])
+
+if __name__ == "__main__":
+    unittest.main()